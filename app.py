@@ -1,74 +1,132 @@
 # --- Final Imports ---
-from flask import Flask, render_template, abort, send_from_directory, request, make_response
+import startup  # First, so the startup report covers every import below
+from flask import Flask, render_template, abort, send_from_directory, request, jsonify, url_for
 import os
+import json
 import sqlite3
-import requests # <-- ADD THIS IMPORT
-import json     # <-- ADD THIS IMPORT
 from datetime import date, datetime
-from content_creator import fetch_and_save_content
-from backup_script import upload_to_gcs
-from google.cloud import storage
-from flask import send_from_directory, request
 import math
-import csv
-from flask import request
-from io import StringIO
-from flask import make_response, url_for
-from datetime import date
-
-# --- This is the "smart path" to our database ---
-DB_PATH = os.path.join(os.getenv('RENDER_DISK_PATH', '.'), 'content.db')
+import calendar
+import re
+from markupsafe import Markup, escape
+import threading
+import fcntl
+import related_articles
+from product_catalog import DEALS_CSV_PATH, ProductCatalog
+from sitemap_writer import SITEMAP_DIR, ensure_sitemaps
+from job_runner import JobRunner
+from response_cache import ResponseCache
+import metrics
+import assets
+import fragments
+import article_views
+from topics import TOPICS, topic_name
+from database import DB_PATH, ARTICLE_CARD_COLUMNS, reading_time, init_db, get_read_connection, reset_read_connections, pool_stats
 
 # --- Phoenix Protocol: The Restore Function ---
 def restore_db_from_gcs():
-    """If the local DB is missing, downloads the latest backup from GCS."""
+    """If the local DB is missing, rebuilds it from the latest backup in the vault."""
     print("!!! PHOENIX PROTOCOL INITIATED: Database not found. Attempting restore. !!!")
-    CREDENTIALS_FILE = "google_credentials.json"
-    BUCKET_NAME = "lazylion-in-backup-vault"
-    SOURCE_BLOB_NAME = "content_backup.db"
-    DESTINATION_FILE_NAME = DB_PATH
+    from backup_script import get_backup_storage, restore_database
+    try:
+        backup_storage = get_backup_storage()
+    except FileNotFoundError:
+        print("!!! PHOENIX PROTOCOL FAILED: google_credentials.json not found. !!!"); return False
     try:
-        if not os.path.exists(CREDENTIALS_FILE):
-            print("!!! PHOENIX PROTOCOL FAILED: google_credentials.json not found. !!!"); return False
-        storage_client = storage.Client.from_service_account_json(CREDENTIALS_FILE)
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(SOURCE_BLOB_NAME)
-        if not blob.exists():
+        print(f"Restoring backup to '{DB_PATH}'...")
+        if not restore_database(backup_storage, DB_PATH):
             print("!!! PHOENIX PROTOCOL FAILED: No backup file found in the cloud vault. !!!"); return False
-        print(f"Downloading backup from GCS to '{DESTINATION_FILE_NAME}'...")
-        blob.download_to_filename(DESTINATION_FILE_NAME)
         print("!!! RESTORE SUCCESSFUL: Database has been recovered. !!!"); return True
     except Exception as e:
         print(f"!!! PHOENIX PROTOCOL FAILED: Could not restore database. Error: {e} !!!"); return False
-def calculate_reading_time(text):
-    """Estimates the reading time for a piece of text."""
-    if not text:
-        return "1 min read"
-    try:
-        word_count = len(text.split())
-        reading_time_minutes = word_count / 200
-        return f"{max(1, round(reading_time_minutes))} min read"
-    except:
-        return "1 min read"
 # --- App Setup ---
 app = Flask(__name__)
-# --- Helper function for Reading Time ---
-def calculate_reading_time(text):
-    """Estimates the reading time for a piece of text."""
-    if not text: return "1 min read"
+metrics.init_app(app)
+assets.init_app(app)
+fragments.init_app(app)
+startup.init_app(app)
+article_views.init_app(app)
+
+# --- Product Catalog ---
+# deals.csv is parsed once per worker and re-read only when the file changes.
+PRODUCT_CATALOG = ProductCatalog(DEALS_CSV_PATH)
+
+# --- Rendered-Page Cache ---
+# Pages only change when an article is added or edited, which bumps content_version
+# (via triggers), so cached pages stay valid until the next ingest from any process.
+@metrics.timed_function('db')
+def get_content_version():
+    """Returns the content version for the response cache."""
+    row = get_read_connection().execute('SELECT version FROM content_version WHERE id = 1').fetchone()
+    return row[0] if row else None
+
+RESPONSE_CACHE = ResponseCache(
+    get_content_version,
+    maxsize=int(os.getenv('RESPONSE_CACHE_SIZE', 512)),
+    disk_dir=os.getenv('RESPONSE_CACHE_DIR'),
+    disk_max_entries=int(os.getenv('RESPONSE_CACHE_DISK_ENTRIES', 5000)),
+)
+
+# --- Startup Restore & Readiness ---
+# If the database is missing, one worker restores it from the vault on a background
+# thread while the others wait on a file lock; /ready answers 503 until it's done.
+RESTORE_LOCK_PATH = f"{DB_PATH}.restore.lock"
+DB_STATE = {'status': 'starting', 'error': None}
+DB_READY = threading.Event()
+
+def _prepare_database():
     try:
-        word_count = len(text.split())
-        reading_time_minutes = word_count / 200
-        return f"{max(1, round(reading_time_minutes))} min read"
-    except:
-        return "1 min read"
+        if not os.path.exists(DB_PATH):
+            DB_STATE['status'] = 'restoring'
+            os.makedirs(os.path.dirname(os.path.abspath(DB_PATH)), exist_ok=True)
+            with open(RESTORE_LOCK_PATH, 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # Another worker may have finished the restore while we waited.
+                    if not os.path.exists(DB_PATH) and not restore_db_from_gcs():
+                        DB_STATE['status'] = 'unavailable'
+                        return
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        # Apply any pending schema migrations (new columns, indexes) before serving reads.
+        init_db()
+        reset_read_connections()
+        DB_STATE['status'] = 'ready'
+        DB_READY.set()
+    except Exception as e:
+        DB_STATE.update(status='failed', error=str(e))
+        print(f"Database startup failed: {e}")
+
+if os.path.exists(DB_PATH):
+    _prepare_database()
+else:
+    threading.Thread(target=_prepare_database, name='db-restore', daemon=True).start()
+
+def _database_ready():
+    if not DB_READY.is_set() and DB_STATE['status'] == 'unavailable' and os.path.exists(DB_PATH):
+        _prepare_database()  # No backup existed, but the journalist has since created the database
+    return DB_READY.is_set()
+
+# Pages read from the database answer 503 until it is ready, so a half-restored
+# database never yields a 404 or an empty page that the response cache would keep.
+DB_ROUTES = {'homepage', 'article_page', 'archive', 'archive_month', 'topic_page', 'search',
+             'sitemap', 'sitemap_shard'}
+
+@app.before_request
+def wait_for_database():
+    if request.endpoint in DB_ROUTES and not _database_ready():
+        return 'The site is starting up, please retry shortly.', 503, {'Retry-After': '10'}
+# --- Helper function for Reading Time ---
+# Stored articles carry a precomputed `reading_time`; this stays for ad-hoc text.
+calculate_reading_time = reading_time
 
 # --- This makes the function available to ALL templates ---
 @app.context_processor
 def utility_processor():
-    return dict(calculate_reading_time=calculate_reading_time)
+    return dict(calculate_reading_time=calculate_reading_time, topic_name=topic_name)
 
 # --- Custom Date Formatting Filter ---
+# Stored articles carry a precomputed `display_date`; this stays for other formats.
 @app.template_filter('strftime')
 def _jinja2_filter_datetime(date_str, fmt=None):
     if not date_str: return ""
@@ -77,30 +135,21 @@ def _jinja2_filter_datetime(date_str, fmt=None):
     if fmt: return date_obj.strftime(fmt)
     else: return date_obj.strftime('%B %d, %Y')
 
-def generate_seo_keywords(headline):
-    """Calls Perplexity to generate SEO keywords for a headline."""
-    print(f"Asking AI for SEO keywords for: '{headline}'...")
-    try:
-        pplx_api_key = os.getenv("PPLX_API_KEY")
-        if not pplx_api_key: raise Exception("PPLX_API_KEY not set.")
-        system_prompt = "You are an SEO expert. Your task is to provide a list of 5-7 relevant keywords for a given news headline. The keywords should be lowercase. Your entire response must be ONLY a comma-separated string of these keywords, with no other text."
-        user_prompt = f"Generate the comma-separated keywords for this headline: {headline}"
-        api_url = "https://api.perplexity.ai/chat/completions"
-        headers = {"accept": "application/json", "content-type": "application/json", "authorization": f"Bearer {pplx_api_key}"}
-        payload = {"model": "sonar", "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]}
-        response = requests.post(api_url, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        keywords_str = response.json()['choices'][0]['message']['content'].strip()
-        print(f"Generated keywords: {keywords_str}")
-        return keywords_str
-    except Exception as e:
-        print(f"Error generating SEO keywords: {e}"); return ""
+# --- SEO Keywords ---
+# Keywords are generated once at ingest time and stored on the article row. Older
+# rows without keywords are filled by `python manage.py backfill-keywords`, never
+# from a request: every worker would pay for its own API call, and each fill
+# would flush the whole page cache.
+def get_seo_keywords(article):
+    """Returns the stored keywords for an article ("" if it has none yet)."""
+    return article.get('seo_keywords') or ""
     
 # --- Database Helper Functions ---
+@metrics.timed_function('db')
 def get_article_with_navigation(article_id):
     """Fetches a single article AND finds the ID/slug for the next and previous articles."""
     try:
-        conn = sqlite3.connect(DB_PATH); conn.row_factory = sqlite3.Row
+        conn = get_read_connection()
         cursor = conn.cursor()
         
         cursor.execute('SELECT * FROM articles WHERE id = ?', (article_id,))
@@ -115,73 +164,140 @@ def get_article_with_navigation(article_id):
         cursor.execute('SELECT id, slug FROM articles WHERE id < ? ORDER BY id DESC LIMIT 1', (article_id,))
         next_article = cursor.fetchone()
         
-        conn.close()
         return {"current": current_article, "previous": previous_article, "next": next_article}
     except Exception as e:
         print(f"Database error fetching article with navigation: {e}"); return None
 
+# Card lists are paginated with keyset seeks on (timestamp, id) instead of OFFSET.
+# The seek key for the start of each page is remembered per worker, keyed on
+# content_version, so any insert, edit or delete drops them all. A page whose key
+# isn't known yet costs one index-only skip from the nearest known page before it
+# (or from the top); pages past the end are refused from the article count without
+# touching the index. After that, /page/<n> costs the same on page 500 as on page 1
+# until the next change. The archive listings (below) use the same anchors, scoped
+# by their WHERE clause.
+_page_anchors = {}
+_page_anchors_version = None
+_page_anchors_lock = threading.Lock()
+
+def _get_page_anchor(cursor, page, per_page, version, total, where='1', params=()):
+    """Returns the (timestamp, id) of the last article on the page before `page`, or None past the end."""
+    global _page_anchors_version
+    if (page - 1) * per_page >= total: return None
+    with _page_anchors_lock:
+        if _page_anchors_version != version:
+            _page_anchors.clear(); _page_anchors_version = version
+        anchor = _page_anchors.get((where, params, per_page, page))
+        known_page, known = 1, None
+        if anchor is None:
+            for earlier in range(page - 1, 1, -1):
+                if (where, params, per_page, earlier) in _page_anchors:
+                    known_page, known = earlier, _page_anchors[(where, params, per_page, earlier)]
+                    break
+    if anchor is None:
+        seek, seek_params = (' AND (timestamp, id) < (?, ?)', known) if known else ('', ())
+        cursor.execute(f'SELECT timestamp, id FROM articles WHERE {where}{seek} '
+                       'ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET ?',
+                       (*params, *seek_params, (page - known_page) * per_page - 1))
+        row = cursor.fetchone()
+        if row is None: return None
+        anchor = (row['timestamp'], row['id'])
+        _remember_page_anchor(page, per_page, version, anchor, where, params)
+    return anchor
+
+def _remember_page_anchor(page, per_page, version, anchor, where='1', params=()):
+    with _page_anchors_lock:
+        if _page_anchors_version == version:
+            _page_anchors[(where, params, per_page, page)] = anchor
+
+@metrics.timed_function('db')
 def get_article_list(page=1, per_page=9):
     """Fetches a specific 'page' of articles from the database."""
-    # The OFFSET is the number of articles to skip.
-    # For page 1, we skip 0. For page 2, we skip 10. And so on.
-    offset = (page - 1) * per_page
-    
-    if not os.path.exists(DB_PATH):
-        if not restore_db_from_gcs(): return []
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_read_connection()
         cursor = conn.cursor()
-        # This new query fetches a "slice" of the data
-        cursor.execute(
-            'SELECT * FROM articles ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?',
-            (per_page, offset)
-        )
+        version, total = cursor.execute(
+            'SELECT version, (SELECT article_count FROM article_stats WHERE id = 1) FROM content_version WHERE id = 1'
+        ).fetchone()
+        if page > 1:
+            after = _get_page_anchor(cursor, page, per_page, version, total)
+            if after is None: return []
+            cursor.execute(
+                f'SELECT {ARTICLE_CARD_COLUMNS} FROM articles WHERE (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?',
+                (after[0], after[1], per_page)
+            )
+        else:
+            cursor.execute(f'SELECT {ARTICLE_CARD_COLUMNS} FROM articles ORDER BY timestamp DESC, id DESC LIMIT ?', (per_page,))
         articles = cursor.fetchall()
-        conn.close()
+        # Remember where the next page starts so "Next" is a pure index seek.
+        if len(articles) == per_page:
+            _remember_page_anchor(page + 1, per_page, version, (articles[-1]['timestamp'], articles[-1]['id']))
         return articles
     except Exception as e:
         print(f"Database error fetching article list: {e}")
         return []
 
-def get_all_articles_for_sitemap():
-    """Fetches ALL articles from the DB for the sitemap."""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        # No LIMIT here, we want everything!
-        cursor.execute('SELECT id, slug, timestamp FROM articles ORDER BY timestamp DESC')
-        articles = cursor.fetchall()
-        conn.close()
-        return articles
-    except Exception as e:
-        print(f"Database error for sitemap: {e}")
-        return []
+@metrics.timed_function('db')
 def get_related_articles(current_article_id, limit=3):
     """
-    Fetches a few random articles from the database to show as "related".
-    It excludes the current article from the results.
+    Fetches the precomputed "related" articles for an article, topped up with
+    random picks if it doesn't have enough neighbours yet.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        return related_articles.get_related_articles(get_read_connection(), current_article_id, limit)
+    except Exception as e:
+        print(f"Database error fetching related articles: {e}")
+        return []
+# --- Full-Text Search ---
+SEARCH_RESULTS_PER_PAGE = 10
+# bm25 column weights: headline, commentary, meta_description, seo_keywords
+SEARCH_RANKING = 'bm25(articles_fts, 10.0, 1.0, 3.0, 5.0)'
+_SNIPPET_OPEN, _SNIPPET_CLOSE = '\x02', '\x03'
+
+def build_fts_query(text):
+    """Turns free text into a safe FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r'\w+', text.lower())[:12]
+    if not words: return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def highlight_snippet(snippet):
+    """Escapes a search snippet and turns the match markers into <mark> tags."""
+    escaped = str(escape(snippet or ''))
+    return Markup(escaped.replace(_SNIPPET_OPEN, '<mark>').replace(_SNIPPET_CLOSE, '</mark>'))
+
+@metrics.timed_function('db')
+def search_articles(text, page=1, per_page=SEARCH_RESULTS_PER_PAGE):
+    """Runs a ranked full-text search. Returns (results, total_matches)."""
+    fts_query = build_fts_query(text)
+    if not fts_query: return [], 0
+    try:
+        conn = get_read_connection()
         cursor = conn.cursor()
-        
+        cursor.execute('SELECT COUNT(*) FROM articles_fts WHERE articles_fts MATCH ?', (fts_query,))
+        total = cursor.fetchone()[0]
         cursor.execute(
-            'SELECT id, slug, headline, image_url, image_alt_text, timestamp FROM articles WHERE id != ? ORDER BY RANDOM() LIMIT ?',
-            (current_article_id, limit)
+            f'''SELECT a.id, a.slug, a.headline, a.image_url, a.image_alt_text, a.timestamp, a.display_date,
+                       snippet(articles_fts, -1, ?, ?, '…', 24) AS snippet
+                FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid
+                WHERE articles_fts MATCH ? ORDER BY {SEARCH_RANKING} LIMIT ? OFFSET ?''',
+            (_SNIPPET_OPEN, _SNIPPET_CLOSE, fts_query, per_page, (page - 1) * per_page)
         )
-        related_articles = cursor.fetchall()
-        
-        conn.close()
-        return related_articles
+        results = []
+        for row in cursor.fetchall():
+            result = dict(row)
+            result['snippet'] = highlight_snippet(row['snippet'])
+            results.append(result)
+        return results, total
     except Exception as e:
-        print(f"Database error fetching related articles: {e}")
-        return []
+        print(f"Database error searching articles: {e}")
+        return [], 0
+
 # --- Main Public Routes ---
 @app.route('/')
 @app.route('/page/<int:page_num>')
+@RESPONSE_CACHE.cached(vary=article_views.trending_generation)
 def homepage(page_num=1):
     """Displays the homepage or a specific page of articles."""
     
@@ -204,143 +320,293 @@ def homepage(page_num=1):
         current_page=page_num,
         total_pages=total_pages
     )
-# --- THIS IS OUR NEW "STOREFRONT" ROUTE ---
-# --- NEW, CORRECTED /DEALS ROUTE ---
+# --- THIS IS OUR "STOREFRONT" ROUTE ---
+DEALS_PER_PAGE = 6
+DEALS_API_MAX_LIMIT = 48
+
 @app.route('/deals')
 def deals():
     """
-    This route reads all products from deals.csv, cleans the headers,
-    and passes the full list to the template for JavaScript to handle.
+    This route renders the storefront with only the first page of product cards;
+    the page's JavaScript fetches everything else from /api/deals.
     """
-    all_products = []
-    try:
-        with open('deals.csv', mode='r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file)
-            # This line removes extra spaces from your CSV column headers
-            reader.fieldnames = [header.strip() for header in reader.fieldnames]
-            
-            for row in reader:
-                all_products.append(row)
-                
-    except FileNotFoundError:
-        print("ERROR: deals.csv was not found.")
-        pass
+    products, total = PRODUCT_CATALOG.search(limit=DEALS_PER_PAGE)
+    return render_template('deals.html', initial_products=products, total_products=total,
+                           per_page=DEALS_PER_PAGE)
 
-    return render_template('deals.html', all_products=all_products)
+@app.route('/api/deals')
+def deals_api():
+    """
+    JSON product search for the storefront.
+    Query args: category, q (title/keyword search), sort (default, price_asc, price_desc),
+    offset (how many matching products to skip) and limit.
+    """
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = min(int(request.args.get('limit', DEALS_PER_PAGE)), DEALS_API_MAX_LIMIT)
+        if offset < 0 or limit < 1: raise ValueError
+        products, total = PRODUCT_CATALOG.search(
+            category=request.args.get('category'),
+            query=request.args.get('q'),
+            sort=request.args.get('sort', 'default'),
+            offset=offset,
+            limit=limit,
+        )
+    except ValueError:
+        return jsonify(error="Invalid offset, limit or sort."), 400
+    return jsonify(products=products, total=total)
 
-# --- NEW, CORRECTED PRODUCT DETAIL ROUTE ---
 @app.route('/deals/product/<slug>')
 def product_detail(slug):
     """
     This route finds a single product by its slug and displays it.
-    It also cleans the CSV headers to make sure the slug can be found.
     """
-    product = None
-    try:
-        with open('deals.csv', mode='r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file)
-            # We apply the same header-cleaning fix here
-            reader.fieldnames = [header.strip() for header in reader.fieldnames]
-            
-            for row in reader:
-                if row.get('slug') == slug:
-                    product = row
-                    break
-                    
-    except FileNotFoundError:
-        abort(404)
-
+    product = PRODUCT_CATALOG.get(slug)
     if product is None:
         abort(404)
 
     return render_template('product_detail.html', product=product)
+@metrics.timed_function('db')
 def get_article_count():
     """Counts the total number of published articles in the database."""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_read_connection()
         cursor = conn.cursor()
-        # This query is super fast and just counts the rows
-        cursor.execute("SELECT COUNT(*) FROM articles")
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
+        # The count is maintained by triggers in article_stats, so this is a single-row read
+        try:
+            cursor.execute("SELECT article_count FROM article_stats WHERE id = 1")
+            row = cursor.fetchone()
+        except sqlite3.OperationalError:
+            row = None  # Database hasn't been migrated yet
+        if row is None:
+            cursor.execute("SELECT COUNT(*) FROM articles")
+            row = cursor.fetchone()
+        return row[0]
     except Exception as e:
         print(f"Database error counting articles: {e}")
         return 0
 
 @app.route('/article/<int:article_id>/<slug>')
+@RESPONSE_CACHE.cached(vary=article_views.trending_generation)
 def article_page(article_id, slug):
     """Displays a single, full article page."""
     article_data = get_article_with_navigation(article_id)
     if article_data is None: abort(404)
     
     article_dict = dict(article_data['current'])
-    seo_keywords = generate_seo_keywords(article_dict['headline'])
+    seo_keywords = get_seo_keywords(article_dict)
     related_articles = get_related_articles(article_id)
-    if article_dict.get('commentary'):
-        article_dict['commentary_paras'] = [p.strip() for p in article_dict['commentary'].split('\n') if p.strip()]
-    else:
-        article_dict['commentary_paras'] = []
-        
-    # We REMOVED the redundant 'reading_time' line here 
+    # Paragraphs, reading time and date were computed when the article was saved.
+    article_dict['commentary_paras'] = json.loads(article_dict['commentary_paras'] or '[]')
     return render_template('article.html', article=article_dict, previous_article=article_data['previous'], next_article=article_data['next'], seo_keywords=seo_keywords, related_articles=related_articles) 
+# --- Archive ---
+# Older articles by month (/archive/2025/10) and by topic (/topic/ai). The month and
+# topic lists and every page count come from `archive_counts`, which triggers keep
+# current (see database.py). The article lists are paginated with the same keyset
+# anchors as the homepage, seeking on (timestamp, id) and (topic, timestamp, id).
+ARCHIVE_PER_PAGE = 12
+
+@metrics.timed_function('db')
+def get_archive_summary():
+    """Returns ([(year, [(month, count), ...]), ...] newest first, {topic: count})."""
+    try:
+        conn = get_read_connection()
+        rows = conn.execute(
+            'SELECT month, SUM(article_count) FROM archive_counts GROUP BY month HAVING SUM(article_count) > 0 ORDER BY month DESC'
+        ).fetchall()
+        years = {}
+        for month, count in rows:
+            years.setdefault(int(month[:4]), []).append((int(month[5:7]), count))
+        topic_counts = dict(conn.execute(
+            'SELECT topic, SUM(article_count) FROM archive_counts GROUP BY topic HAVING SUM(article_count) > 0'
+        ).fetchall())
+        return list(years.items()), topic_counts
+    except Exception as e:
+        print(f"Database error fetching the archive summary: {e}")
+        return [], {}
+
+@metrics.timed_function('db')
+def get_archive_articles(where, params, count_where, count_params, page, per_page=ARCHIVE_PER_PAGE, seek_where=None, seek_params=None):
+    """Returns (articles, total) for one page of an archive listing, newest first.
+
+    `seek_where` replaces `where` once a page anchor is known. It may leave out an
+    upper bound on timestamp, so the anchor becomes the start of the index range.
+    """
+    if seek_where is None: seek_where, seek_params = where, params
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor()
+        total = cursor.execute(f'SELECT COALESCE(SUM(article_count), 0) FROM archive_counts WHERE {count_where}', count_params).fetchone()[0]
+        version = cursor.execute('SELECT version FROM content_version WHERE id = 1').fetchone()[0]
+        if page > 1:
+            after = _get_page_anchor(cursor, page, per_page, version, total, where, params)
+            if after is None: return [], total
+            cursor.execute(
+                f'SELECT {ARTICLE_CARD_COLUMNS} FROM articles WHERE {seek_where} AND (timestamp, id) < (?, ?) '
+                'ORDER BY timestamp DESC, id DESC LIMIT ?',
+                (*seek_params, after[0], after[1], per_page)
+            )
+        else:
+            cursor.execute(f'SELECT {ARTICLE_CARD_COLUMNS} FROM articles WHERE {where} ORDER BY timestamp DESC, id DESC LIMIT ?',
+                           (*params, per_page))
+        articles = cursor.fetchall()
+        if len(articles) == per_page:
+            _remember_page_anchor(page + 1, per_page, version, (articles[-1]['timestamp'], articles[-1]['id']), where, params)
+        return articles, total
+    except Exception as e:
+        print(f"Database error fetching archive articles: {e}")
+        return [], 0
+
+def _render_archive_list(title, articles, total, page_num, url_args):
+    if not articles and page_num > 1: abort(404)
+    return render_template('archive_list.html', title=title, articles=articles, total_articles=total,
+                           current_page=page_num, total_pages=math.ceil(total / ARCHIVE_PER_PAGE),
+                           endpoint=request.endpoint, url_args=url_args)
+
+@app.route('/archive')
+@RESPONSE_CACHE.cached
+def archive():
+    """Lists every month and topic that has articles, with their counts."""
+    years, topic_counts = get_archive_summary()
+    topics = [(slug, name, topic_counts[slug]) for slug, (name, _) in TOPICS.items() if topic_counts.get(slug)]
+    return render_template('archive.html', years=years, topics=topics, month_names=calendar.month_name)
+
+@app.route('/archive/<int:year>/<int:month>', defaults={'page_num': 1})
+@app.route('/archive/<int:year>/<int:month>/page/<int:page_num>')
+@RESPONSE_CACHE.cached
+def archive_month(year, month, page_num):
+    """One month's articles."""
+    if not 1 <= month <= 12 or not 1000 <= year <= 9999 or page_num < 1: abort(404)
+    start = f'{year:04d}-{month:02d}-01'
+    end = f'{year + month // 12:04d}-{month % 12 + 1:02d}-01'
+    articles, total = get_archive_articles('timestamp >= ? AND timestamp < ?', (start, end),
+                                           'month = ?', (start[:7],), page_num,
+                                           seek_where='timestamp >= ?', seek_params=(start,))
+    if not total: abort(404)
+    title = date(year, month, 1).strftime('%B %Y')
+    return _render_archive_list(title, articles, total, page_num, dict(year=year, month=month))
+
+@app.route('/topic/<topic>', defaults={'page_num': 1})
+@app.route('/topic/<topic>/page/<int:page_num>')
+@RESPONSE_CACHE.cached
+def topic_page(topic, page_num):
+    """One topic's articles."""
+    if topic not in TOPICS or page_num < 1: abort(404)
+    articles, total = get_archive_articles('topic = ?', (topic,), 'topic = ?', (topic,), page_num)
+    return _render_archive_list(topic_name(topic), articles, total, page_num, dict(topic=topic))
+
 # --- Special File Routes ---
 @app.route('/robots.txt')
 def static_from_root():
     return send_from_directory(app.static_folder, request.path[1:])
 
+@app.route('/search')
+def search():
+    """Full-text search over all articles."""
+    query = request.args.get('q', '').strip()
+    page_num = request.args.get('page', 1, type=int)
+    if page_num < 1: abort(404)
+    results, total = search_articles(query, page=page_num) if query else ([], 0)
+    total_pages = math.ceil(total / SEARCH_RESULTS_PER_PAGE)
+    return render_template('search.html', query=query, results=results, total_results=total,
+                           current_page=page_num, total_pages=total_pages)
+
+@app.route('/ready')
+def readiness():
+    """Readiness probe: 503 until the database exists (restored if needed) and is migrated."""
+    if _database_ready():
+        return jsonify(status='ready')
+    return jsonify(status=DB_STATE['status'], error=DB_STATE['error']), 503
+
+@app.route('/db-pool-stats')
+def db_pool_stats():
+    """Reports how this worker's shared SQLite read connections are being used."""
+    return jsonify(pool_stats())
+
 # --- Secret "Cron Job" Routes ---
+# The jobs run on a background thread; the trigger returns 202 straight away with
+# a job id whose progress can be followed at /jobs/<job_id>.
+JOB_RUNNER = JobRunner(max_workers=2)
+
+# The job functions print their own errors and return an empty result instead of
+# raising, so the wrappers turn that into an exception for the job history.
+def _journalist_job(batch_size=None):
+    from content_creator import fetch_and_save_content
+    article_ids = fetch_and_save_content(batch_size=batch_size)
+    if not article_ids:
+        raise RuntimeError("No articles were saved (see the log for the cause).")
+    RESPONSE_CACHE.invalidate()
+    return article_ids
+
+def _queue_job(name, func):
+    job_id, created = JOB_RUNNER.submit(name, func)
+    status = "queued" if created else "already running"
+    return jsonify(job_id=job_id, status=status, status_url=url_for('job_status', job_id=job_id)), 202
+
 @app.route('/run-journalist-job-a7b3c9d1')
 def run_journalist_job():
-    try: fetch_and_save_content(); return "Content creator job executed successfully.", 200
-    except Exception as e: return f"An error occurred: {e}", 500
+    # ?count=N writes a batch of N articles in one run (capped in content_creator).
+    batch_size = request.args.get('count', type=int)
+    return _queue_job('journalist', lambda: _journalist_job(batch_size))
+
+def _backup_job():
+    from backup_script import upload_to_gcs
+    created_at = upload_to_gcs()
+    if created_at is None:
+        raise RuntimeError("The backup did not complete (see the log for the cause).")
+    return created_at
 
 @app.route('/run-backup-job-b8c4d1e2')
 def run_backup_job():
-    try: upload_to_gcs(); return "Backup job executed.", 200
-    except Exception as e: return f"An error occurred: {e}", 500
+    return _queue_job('backup', _backup_job)
+
+def _public_job(job):
+    # The stored error carries a traceback for the logs; these routes are public, so only its first line goes out.
+    if job.get('error'):
+        job = dict(job, error=job['error'].split('\n', 1)[0])
+    return job
+
+@app.route('/jobs')
+def job_history():
+    """Lists the most recent background job runs, newest first."""
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    return jsonify(jobs=[_public_job(job) for job in JOB_RUNNER.history(name=request.args.get('name'), limit=limit)])
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Reports the status, timing and outcome of a background job."""
+    job = JOB_RUNNER.get(job_id)
+    if job is None: abort(404)
+    return jsonify(_public_job(job))
+
+def _serve_sitemap_file(filename):
+    """Serves a pre-generated sitemap file, regenerating the set first if it is out of date."""
+    try:
+        with metrics.timed('file'):
+            ensure_sitemaps(get_read_connection(), PRODUCT_CATALOG)
+    except Exception as e:
+        print(f"Sitemap Generation: could not refresh sitemaps: {e}")
+    if not os.path.exists(os.path.join(SITEMAP_DIR, filename)):
+        abort(404)
+    return send_from_directory(SITEMAP_DIR, filename, mimetype='application/xml', max_age=3600)
 
 @app.route('/sitemap.xml')
 def sitemap():
     """
-    Generates a sitemap.xml file that includes static pages,
-    articles from the database, and products from deals.csv.
+    Serves the sitemap: static pages, every article and every product from deals.csv.
+    Once the site outgrows one file this is a sitemap index pointing at /sitemaps/*.xml.
     """
-    last_updated = date.today().isoformat()
+    return _serve_sitemap_file('sitemap.xml')
 
-    # --- 1. Get Products from CSV ---
-    products = []
-    try:
-        with open('deals.csv', mode='r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file)
-            reader.fieldnames = [header.strip() for header in reader.fieldnames]
-            products = list(reader)
-    except FileNotFoundError:
-        print("Sitemap Generation: deals.csv not found. Products will not be included.")
-        pass
+@app.route('/sitemaps/<name>.xml')
+def sitemap_shard(name):
+    """Serves one shard of a sharded sitemap."""
+    if not re.fullmatch(r'pages|articles-\d+', name):
+        abort(404)
+    return _serve_sitemap_file(f'{name}.xml')
+
+startup.app_loaded()
 
-    # --- 2. Get Articles from Database ---
-    # This uses your existing function to get articles
-    try:
-        articles = get_all_articles_for_sitemap()
-        if articles:
-            # Use the most recent article's date as the last update time
-            last_updated = articles[0]['timestamp'].split(' ')[0]
-    except NameError:
-        print("Sitemap Generation: get_all_articles_for_sitemap() not found. Articles will not be included.")
-        articles = []
-
-    # --- 3. Render the Sitemap Template with BOTH articles and products ---
-    sitemap_xml = render_template('sitemap.xml', 
-                                  articles=articles, 
-                                  products=products, 
-                                  last_updated=last_updated)
-    
-    response = make_response(sitemap_xml)
-    response.headers['Content-Type'] = 'application/xml'
-    return response
-    
-    return response
 # --- Start the server ---
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5001))
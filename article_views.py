@@ -0,0 +1,182 @@
+import atexit
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import request
+
+import database
+
+# --- Article Views & Trending ---
+# Article page views are counted in memory and written to `article_views` (one row
+# per article per UTC day) by a background thread every VIEW_FLUSH_INTERVAL seconds,
+# in one transaction per flush, so a page view never waits on the SQLite write lock.
+# Every worker flushes its own counts; the upsert adds them together.
+#
+# The same thread recomputes the trending list every TRENDING_INTERVAL seconds: the
+# last TRENDING_WINDOW_DAYS of views, each day's count halved every
+# TRENDING_HALF_LIFE_DAYS. Templates get it through trending_articles(), and
+# trending_generation() (which only changes when the list does) is part of the
+# response-cache key of the pages that show it.
+
+ENABLED = os.getenv('VIEW_COUNTING', '1') != '0'
+# The static export turns this off: it can't re-render every article page whenever the list changes.
+ARTICLE_PAGE_TRENDING = os.getenv('ARTICLE_PAGE_TRENDING', '1') != '0'
+FLUSH_INTERVAL = float(os.getenv('VIEW_FLUSH_INTERVAL', 10))
+TRENDING_INTERVAL = float(os.getenv('TRENDING_INTERVAL', 300))
+TRENDING_HALF_LIFE_DAYS = float(os.getenv('TRENDING_HALF_LIFE_DAYS', 2))
+TRENDING_WINDOW_DAYS = 14
+TRENDING_SIZE = 5
+# Crawlers and link previews aren't readers.
+BOT_MARKERS = ('bot', 'crawl', 'spider', 'slurp', 'preview', 'headless')
+
+UPSERT_SQL = '''INSERT INTO article_views (article_id, day, views) VALUES (?, ?, ?)
+                ON CONFLICT (article_id, day) DO UPDATE SET views = views + excluded.views'''
+
+
+def decayed_scores(rows, now=None, half_life_days=TRENDING_HALF_LIFE_DAYS):
+    """{article_id: score} from (article_id, day, views) rows, halving a day's views every half-life."""
+    now = now or datetime.now(timezone.utc)
+    scores = {}
+    for article_id, day, views in rows:
+        day_start = datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        # Measured from the middle of the day, since the views are spread across it.
+        age_days = max(0.0, (now - day_start).total_seconds() / 86400 - 0.5)
+        scores[article_id] = scores.get(article_id, 0.0) + views * 0.5 ** (age_days / half_life_days)
+    return scores
+
+
+def compute_trending(conn, size=TRENDING_SIZE):
+    """Returns (cards, generation): the most-read articles and a short hash of that list."""
+    since = (datetime.now(timezone.utc) - timedelta(days=TRENDING_WINDOW_DAYS)).strftime('%Y-%m-%d')
+    scores = decayed_scores(conn.execute('SELECT article_id, day, views FROM article_views WHERE day >= ?', (since,)))
+    top = sorted(scores, key=lambda article_id: (-scores[article_id], -article_id))[:size]
+    cards = []
+    if top:
+        placeholders = ','.join('?' * len(top))
+        rows = {row['id']: row for row in conn.execute(
+            f'SELECT id, slug, headline, display_date FROM articles WHERE id IN ({placeholders})', top)}
+        cards = [dict(rows[article_id]) for article_id in top if article_id in rows]
+    signature = repr([(card['id'], card['slug'], card['headline']) for card in cards]).encode('utf-8')
+    return cards, hashlib.sha1(signature).hexdigest()[:12]
+
+
+class ViewCounter:
+    """Buffers page views in memory and keeps the trending list, both on one background thread."""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, trending_interval=TRENDING_INTERVAL):
+        self.flush_interval = flush_interval
+        self.trending_interval = trending_interval
+        self._pending = {}  # (article_id, day) -> views not yet written
+        self._lock = threading.Lock()
+        self._trending = ([], '')  # (cards, generation), swapped as a whole
+        self._trending_loaded = False
+        self._next_trending = 0.0
+        self._thread = None
+        self._pid = None
+        self._local = threading.local()  # Per-thread write connection (the flusher, or atexit)
+
+    # --- Counting ---
+    def record(self, article_id):
+        key = (article_id, datetime.now(timezone.utc).strftime('%Y-%m-%d'))
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + 1
+        self._ensure_running()
+
+    def flush(self):
+        """Writes the buffered counts in one transaction. Returns how many views were written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = database.connect()
+            with conn:
+                conn.executemany(UPSERT_SQL, [(article_id, day, views) for (article_id, day), views in pending.items()])
+        except Exception as e:
+            print(f"Article views: could not write {sum(pending.values())} views, will retry: {e}")
+            with self._lock:
+                for key, views in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + views
+            return 0
+        return sum(pending.values())
+
+    # --- Trending ---
+    def refresh_trending(self):
+        """Recomputes the trending list from the stored views."""
+        try:
+            self._trending = compute_trending(database.get_read_connection())
+        except Exception as e:
+            print(f"Article views: could not compute the trending list: {e}")
+            return
+        self._trending_loaded = True
+
+    def trending(self):
+        """[{'id', 'slug', 'headline', 'display_date'}, ...], most read first."""
+        self._load_trending()
+        return self._trending[0]
+
+    def generation(self):
+        """Changes whenever the trending list does."""
+        self._load_trending()
+        return self._trending[1]
+
+    def _load_trending(self):
+        if not self._trending_loaded:
+            self._trending_loaded = True
+            self.refresh_trending()
+            self._next_trending = time.monotonic() + self.trending_interval
+        self._ensure_running()
+
+    # --- Background thread ---
+    def _ensure_running(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Also runs again in each forked worker, which inherits no threads.
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='article-views', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+            if time.monotonic() >= self._next_trending:
+                self.refresh_trending()
+                self._next_trending = time.monotonic() + self.trending_interval
+
+
+VIEW_COUNTER = ViewCounter()
+
+
+def trending_generation():
+    return VIEW_COUNTER.generation()
+
+
+def _is_bot(user_agent):
+    user_agent = (user_agent or '').lower()
+    return not user_agent or any(marker in user_agent for marker in BOT_MARKERS)
+
+
+def init_app(app, endpoint='article_page'):
+    """Counts views of `endpoint` pages and makes trending_articles() available to templates."""
+
+    @app.after_request
+    def count_article_view(response):
+        # Runs outside the cached view, so cached and 304 responses are counted too.
+        if ENABLED and request.endpoint == endpoint and request.method == 'GET' \
+                and response.status_code in (200, 304) and not _is_bot(request.user_agent.string):
+            VIEW_COUNTER.record(request.view_args['article_id'])
+        return response
+
+    @app.context_processor
+    def trending_helpers():
+        return dict(trending_articles=VIEW_COUNTER.trending, article_page_trending=ARTICLE_PAGE_TRENDING)
@@ -0,0 +1,281 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import request, send_from_directory, url_for
+
+import images
+
+# --- Static Asset Pipeline ---
+# `python manage.py build-assets` copies every file under static/ to static/build/
+# with a content hash in its name, bundles the page scripts/styles, minifies them
+# when rjsmin/rcssmin are installed, and writes .gz (and .br with the brotli
+# package) siblings for text assets. static/build/manifest.json maps each logical
+# name ('css/main.css') to its hashed copy; init_app() makes url_for('static', ...)
+# return the hashed URL, which is served with a one-year immutable Cache-Control.
+# Without a manifest everything falls back to the plain files in static/.
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+BUILD_DIR_NAME = 'build'
+MANIFEST_NAME = 'manifest.json'
+STATIC_URL_PATH = '/static'
+SKIP_DIRS = {BUILD_DIR_NAME, 'sass'}
+HASH_LENGTH = 12
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.xml', '.html', '.eot', '.ttf', '.otf'}
+
+# Logical bundle name -> the files it replaces, in load order.
+BUNDLES = {
+    'js/site.js': ['js/jquery.min.js', 'js/jquery.scrollex.min.js', 'js/jquery.scrolly.min.js',
+                   'js/browser.min.js', 'js/breakpoints.min.js', 'js/util.js', 'js/main.js'],
+    'css/shop.css': ['css/bootstrap.min.css', 'css/bootstrap-icons.css'],
+}
+
+CSS_IMPORT_RE = re.compile(r'@import\s+(?:url\()?\s*["\']?([^"\')\s;]+)["\']?\s*\)?\s*;')
+CSS_URL_RE = re.compile(r'url\(\s*(["\']?)([^"\')]+)\1\s*\)')
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+INDENT_RE = re.compile(r'^[ \t]+', re.M)
+BLANK_LINES_RE = re.compile(r'\n\s*\n+')
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# --- Build ---
+def _hashed_name(logical, data):
+    stem, ext = posixpath.splitext(logical)
+    return f"{BUILD_DIR_NAME}/{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def _is_external(url):
+    return url.startswith(('data:', 'http:', 'https:', '//', '#', '/'))
+
+
+def _split_suffix(url):
+    """'../webfonts/fa.eot?#iefix' -> ('../webfonts/fa.eot', '?#iefix')"""
+    match = re.search(r'[?#]', url)
+    return (url[:match.start()], url[match.start():]) if match else (url, '')
+
+
+def _process_css(static_dir, logical, files, seen=None):
+    """Reads a stylesheet, inlining local @imports and pointing url()s at hashed files.
+
+    URLs are made absolute because the built file lives in a different directory.
+    """
+    seen = (seen or set()) | {logical}
+    with open(os.path.join(static_dir, logical), encoding='utf-8') as f:
+        css = f.read()
+    base = posixpath.dirname(logical)
+
+    def inline_import(match):
+        target = match.group(1)
+        if _is_external(target):
+            return match.group(0)
+        path = posixpath.normpath(posixpath.join(base, target))
+        if path in seen or not os.path.exists(os.path.join(static_dir, path)):
+            return match.group(0)
+        return _process_css(static_dir, path, files, seen)
+
+    def rewrite_url(match):
+        quote, url = match.group(1), match.group(2).strip()
+        if _is_external(url):
+            return match.group(0)
+        path, suffix = _split_suffix(url)
+        path = posixpath.normpath(posixpath.join(base, path))
+        return f"url({quote}{STATIC_URL_PATH}/{files.get(path, path)}{suffix}{quote})"
+
+    css = CSS_IMPORT_RE.sub(inline_import, css)
+    # @imports that must stay (e.g. Google Fonts) are only valid before any rule.
+    imports = [m.group(0) for m in CSS_IMPORT_RE.finditer(css)]
+    css = CSS_IMPORT_RE.sub('', css)
+    return '\n'.join(imports + [CSS_URL_RE.sub(rewrite_url, css)])
+
+
+def _minify_css(css):
+    if rcssmin:
+        return rcssmin.cssmin(css)
+    # Without rcssmin: drop comments, indentation and blank lines, which is always safe.
+    css = CSS_COMMENT_RE.sub('', css)
+    return BLANK_LINES_RE.sub('\n', INDENT_RE.sub('', css)).strip() + '\n'
+
+
+def _minify_js(logical, js):
+    if rjsmin and not logical.endswith('.min.js'):
+        return rjsmin.jsmin(js)
+    return js
+
+
+def _write_built(static_dir, logical, data, files):
+    name = _hashed_name(logical, data)
+    path = os.path.join(static_dir, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    files[logical] = name
+    if os.path.splitext(logical)[1] in COMPRESSIBLE_EXTENSIONS:
+        _precompress(path, data)
+
+
+def _precompress(path, data):
+    """Writes .gz/.br siblings, but only when they actually save bytes."""
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        with open(path + '.gz', 'wb') as f:
+            f.write(compressed)
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            with open(path + '.br', 'wb') as f:
+                f.write(compressed)
+
+
+def _source_files(static_dir):
+    for root, dirs, filenames in os.walk(static_dir):
+        if root == static_dir:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for filename in filenames:
+            if not filename.startswith('.'):
+                yield os.path.relpath(os.path.join(root, filename), static_dir).replace(os.sep, '/')
+
+
+def build_assets(static_dir=STATIC_DIR):
+    """Builds static/build/ and its manifest. Returns the manifest."""
+    build_dir = os.path.join(static_dir, BUILD_DIR_NAME)
+    # The previous build is kept until the next one, so pages already rendered with
+    # its URLs keep working until they're replaced; anything older is pruned.
+    previous = load_manifest(static_dir)
+    os.makedirs(build_dir, exist_ok=True)
+    sources = sorted(_source_files(static_dir))
+    files = {}
+
+    # 1. Everything that isn't CSS/JS is copied as-is, so stylesheets can point at it.
+    for logical in sources:
+        if not logical.endswith(('.css', '.js')):
+            with open(os.path.join(static_dir, logical), 'rb') as f:
+                _write_built(static_dir, logical, f.read(), files)
+
+    # Width-bucketed derivatives of the local images (needs Pillow).
+    image_variants = images.build_static_derivatives(static_dir, sources, BUILD_DIR_NAME)
+
+    # 2. Stylesheets and scripts, individually (templates may still link them one by one).
+    processed = {}
+    for logical in sources:
+        if logical.endswith('.css'):
+            processed[logical] = _minify_css(_process_css(static_dir, logical, files))
+        elif logical.endswith('.js'):
+            with open(os.path.join(static_dir, logical), encoding='utf-8') as f:
+                processed[logical] = _minify_js(logical, f.read())
+        else:
+            continue
+        _write_built(static_dir, logical, processed[logical].encode('utf-8'), files)
+
+    # 3. Bundles: one request per page instead of one per file.
+    for bundle, members in BUNDLES.items():
+        separator = ';\n' if bundle.endswith('.js') else '\n'
+        body = separator.join(processed[member] for member in members)
+        _write_built(static_dir, bundle, body.encode('utf-8'), files)
+
+    manifest = {'files': files, 'bundles': BUNDLES, 'images': image_variants}
+    tmp_path = os.path.join(build_dir, f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(build_dir, MANIFEST_NAME))
+    pruned = _prune_build(static_dir, [manifest, previous])
+    print(f"Built {len(files)} static assets into '{build_dir}' "
+          f"(minify: {'yes' if rjsmin and rcssmin else 'partial'}, brotli: {'yes' if brotli else 'no'}, "
+          f"pruned {pruned} old files).")
+    return manifest
+
+
+def _built_names(manifest):
+    names = set(manifest.get('files', {}).values())
+    names.update(name for variants in manifest.get('images', {}).values() for _, name in variants)
+    return names
+
+
+def _prune_build(static_dir, manifests):
+    """Deletes built files (and their .gz/.br siblings) that none of `manifests` refer to. Returns how many."""
+    keep = {f"{BUILD_DIR_NAME}/{MANIFEST_NAME}"}
+    for manifest in manifests:
+        if manifest:
+            keep.update(name + suffix for name in _built_names(manifest) for suffix in ('', '.gz', '.br'))
+    pruned = 0
+    build_dir = os.path.join(static_dir, BUILD_DIR_NAME)
+    for root, dirs, filenames in os.walk(build_dir, topdown=False):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            if os.path.relpath(path, static_dir).replace(os.sep, '/') not in keep:
+                try:
+                    os.remove(path)
+                    pruned += 1
+                except OSError as e:
+                    print(f"Could not remove old build file '{path}': {e}")
+        if root != build_dir and not os.listdir(root):
+            os.rmdir(root)
+    return pruned
+
+
+# --- Serving ---
+def load_manifest(static_dir=STATIC_DIR):
+    try:
+        with open(os.path.join(static_dir, BUILD_DIR_NAME, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def init_app(app):
+    """Points url_for('static', ...) at the hashed files and serves them with long-lived caching."""
+    manifest = load_manifest(app.static_folder) or {'files': {}}
+    files = manifest['files']
+    images.init_app(app, manifest)
+    hashed = _built_names(manifest)
+    if files:
+        print(f"Static assets: using {len(files)} fingerprinted files from the build manifest.")
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in files:
+            values['filename'] = files[values['filename']]
+
+    @app.context_processor
+    def asset_helpers():
+        return dict(asset_urls=asset_urls)
+
+    def asset_urls(name):
+        """The URLs to load for a bundle: the built bundle, or its source files without a build."""
+        if name in files or name not in BUNDLES:
+            return [url_for('static', filename=name)]
+        return [url_for('static', filename=member) for member in BUNDLES[name]]
+
+    def serve_static(filename):
+        if filename not in hashed:
+            return app.send_static_file(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, ext in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in request.accept_encodings and os.path.exists(os.path.join(app.static_folder, filename + ext)):
+                response = send_from_directory(app.static_folder, filename + ext, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(app.static_folder, filename, mimetype=mimetype)
+        # The name changes whenever the content does, so browsers never need to revalidate.
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.view_functions['static'] = serve_static
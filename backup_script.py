@@ -1,35 +1,345 @@
+import hashlib
+import json
 import os
-from google.cloud import storage
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 # This is the "smart path" to our local database file.
 # On Render, it will be '/var/data/content.db'. Locally, it will be './content.db'.
 SOURCE_FILE_NAME = os.path.join(os.getenv('RENDER_DISK_PATH', '.'), 'content.db')
 
 # --- CONFIGURATION for Google Cloud Storage ---
-CREDENTIALS_FILE = "google_credentials.json" 
+CREDENTIALS_FILE = "google_credentials.json"
 BUCKET_NAME = "lazylion-in-backup-vault"
-DESTINATION_BLOB_NAME = "content_backup.db"
+DESTINATION_BLOB_NAME = "content_backup.db"  # The old whole-file backup, still readable by restores
+
+# --- Incremental Backup Layout ---
+# A backup is a consistent snapshot of content.db split into fixed-size chunks.
+# Each chunk is stored compressed under its own SHA-256, so a chunk that didn't
+# change since the last run is already in the vault and isn't uploaded again:
+#   chunks/<sha256>.z           - zlib-compressed chunk
+#   manifests/<timestamp>.json  - the ordered chunk list for one snapshot
+#   manifests/latest.json       - a copy of the newest manifest
+# After each backup, all but the newest BACKUP_KEEP_MANIFESTS timestamped manifests
+# are deleted, then every chunk none of the remaining manifests refers to.
+# Set BACKUP_STORAGE_DIR to back up into a local directory instead of GCS.
+CHUNK_SIZE = 1024 * 1024  # A multiple of every SQLite page size
+COMPRESSION_LEVEL = 6
+MANIFEST_PREFIX = "manifests/"
+LATEST_MANIFEST = MANIFEST_PREFIX + "latest.json"
+CHUNK_PREFIX = "chunks/"
+BACKUP_KEEP_MANIFESTS = int(os.getenv('BACKUP_KEEP_MANIFESTS', '30'))
+
+
+def chunk_name(digest):
+    return f"{CHUNK_PREFIX}{digest}.z"
+
+
+# --- Storage Backends ---
+class LocalStorage:
+    """Stores backup objects as files under a directory. A stand-in for the GCS bucket."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def exists(self, name):
+        return os.path.exists(self._path(name))
+
+    def read(self, name):
+        """Returns the object's bytes, or None if it doesn't exist."""
+        try:
+            with open(self._path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def list(self, prefix):
+        """Names of the objects whose name starts with `prefix` (a directory, e.g. 'chunks/')."""
+        directory = self._path(prefix.rstrip('/'))
+        if not os.path.isdir(directory):
+            return []
+        return [prefix + name for name in os.listdir(directory) if not name.endswith('.tmp')]
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def download_to_filename(self, name, filename):
+        """Copies an object to a local file. Returns False if it doesn't exist."""
+        data = self.read(name)
+        if data is None:
+            return False
+        with open(filename, 'wb') as f:
+            f.write(data)
+        return True
+
+
+class GCSStorage:
+    """Stores backup objects as blobs in the Google Cloud Storage vault."""
+
+    def __init__(self, bucket_name=BUCKET_NAME, credentials_file=CREDENTIALS_FILE):
+        from google.cloud import storage
+        storage_client = storage.Client.from_service_account_json(credentials_file)
+        self.bucket = storage_client.bucket(bucket_name)
+
+    def exists(self, name):
+        return self.bucket.blob(name).exists()
+
+    def read(self, name):
+        """Returns the object's bytes, or None if it doesn't exist."""
+        from google.api_core.exceptions import NotFound
+        try:
+            return self.bucket.blob(name).download_as_bytes()
+        except NotFound:
+            return None
+
+    def write(self, name, data):
+        self.bucket.blob(name).upload_from_string(data)
+
+    def list(self, prefix):
+        """Names of the objects whose name starts with `prefix`."""
+        return [blob.name for blob in self.bucket.list_blobs(prefix=prefix)]
+
+    def delete(self, name):
+        from google.api_core.exceptions import NotFound
+        try:
+            self.bucket.blob(name).delete()
+        except NotFound:
+            pass
+
+    def download_to_filename(self, name, filename):
+        """Copies an object to a local file. Returns False if it doesn't exist."""
+        blob = self.bucket.blob(name)
+        if not blob.exists():
+            return False
+        blob.download_to_filename(filename)
+        return True
+
+
+def get_backup_storage():
+    """The configured backup backend: BACKUP_STORAGE_DIR if set, otherwise the GCS bucket."""
+    local_dir = os.getenv('BACKUP_STORAGE_DIR')
+    if local_dir:
+        return LocalStorage(local_dir)
+    if not os.path.exists(CREDENTIALS_FILE):
+        raise FileNotFoundError(f"{CREDENTIALS_FILE} not found.")
+    return GCSStorage()
+
+
+# --- Backup ---
+def take_snapshot(source_path, snapshot_path):
+    """Copies the live database with SQLite's online backup API, so the copy is
+    transactionally consistent even while the journalist is writing."""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(snapshot_path)
+    try:
+        source.backup(target)
+        # The snapshot is restored as a standalone file, so it shouldn't depend on a WAL.
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+
+def read_manifest(storage, name=LATEST_MANIFEST):
+    data = storage.read(name)
+    return json.loads(data) if data else None
+
+
+def backup_database(storage, source_path=SOURCE_FILE_NAME):
+    """Snapshots the database and uploads the chunks the vault doesn't have yet.
+    Returns the new manifest."""
+    snapshot_path = f"{source_path}.backup-snapshot"
+    previous = read_manifest(storage)
+    known = set(previous['chunks']) if previous else set()
+    try:
+        take_snapshot(source_path, snapshot_path)
+        file_hash = hashlib.sha256()
+        chunks, uploaded, uploaded_bytes = [], 0, 0
+        for data in iter_chunks(snapshot_path):
+            file_hash.update(data)
+            digest = hashlib.sha256(data).hexdigest()
+            chunks.append(digest)
+            if digest in known:
+                continue
+            known.add(digest)
+            if storage.exists(chunk_name(digest)):
+                continue
+            compressed = zlib.compress(data, COMPRESSION_LEVEL)
+            storage.write(chunk_name(digest), compressed)
+            uploaded += 1
+            uploaded_bytes += len(compressed)
+        manifest = {
+            'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'size': os.path.getsize(snapshot_path),
+            'sha256': file_hash.hexdigest(),
+            'chunk_size': CHUNK_SIZE,
+            'chunks': chunks,
+        }
+    finally:
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+
+    body = json.dumps(manifest).encode('utf-8')
+    storage.write(MANIFEST_PREFIX + manifest['created_at'].replace(':', '') + '.json', body)
+    storage.write(LATEST_MANIFEST, body)
+    print(f"Snapshot is {manifest['size']} bytes in {len(chunks)} chunks; "
+          f"uploaded {uploaded} new chunks ({uploaded_bytes} bytes compressed).")
+    return manifest
+
+
+def prune_backups(storage, keep=BACKUP_KEEP_MANIFESTS):
+    """Deletes all but the newest `keep` snapshots and the chunks only they used.
+    Returns (manifests deleted, chunks deleted)."""
+    keep = max(1, keep)
+    # Timestamped names sort chronologically.
+    manifests = sorted(name for name in storage.list(MANIFEST_PREFIX) if name != LATEST_MANIFEST)
+    expired, kept = manifests[:-keep], manifests[-keep:]
+    referenced = set()
+    for name in kept + [LATEST_MANIFEST]:
+        manifest = read_manifest(storage, name)
+        if manifest is None:
+            if name == LATEST_MANIFEST:
+                raise ValueError("No latest manifest in the vault; not pruning.")
+            continue
+        referenced.update(manifest['chunks'])
+    # Manifests go first, so an interrupted prune never leaves one pointing at deleted chunks.
+    for name in expired:
+        storage.delete(name)
+    orphans = [name for name in storage.list(CHUNK_PREFIX)
+               if name.endswith('.z') and name[len(CHUNK_PREFIX):-len('.z')] not in referenced]
+    for name in orphans:
+        storage.delete(name)
+    return len(expired), len(orphans)
+
+
+# --- Restore ---
+RESTORE_WORKERS = int(os.getenv('RESTORE_WORKERS', '8'))
+
+
+def _fetch_chunk(storage, digest):
+    """Downloads, decompresses and verifies one chunk."""
+    compressed = storage.read(chunk_name(digest))
+    if compressed is None:
+        raise ValueError(f"Chunk {digest} is missing from the vault.")
+    data = zlib.decompress(compressed)
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f"Chunk {digest} is corrupt.")
+    return data
+
+
+def _download_chunks(storage, manifest, path, max_workers):
+    """Downloads every chunk in parallel, writing each one at its own offset in `path`."""
+    chunk_size = manifest['chunk_size']
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, manifest['size'])
+
+        def fetch_and_write(position, digest):
+            os.pwrite(fd, _fetch_chunk(storage, digest), position * chunk_size)
+
+        # A chunk shared by several offsets is downloaded once per offset; that's rare
+        # (mostly runs of empty pages) and keeps the workers independent.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(fetch_and_write, position, digest)
+                       for position, digest in enumerate(manifest['chunks'])]
+            for future in futures:
+                future.result()
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def file_sha256(path):
+    file_hash = hashlib.sha256()
+    for data in iter_chunks(path):
+        file_hash.update(data)
+    return file_hash.hexdigest()
+
+
+def verify_database(path):
+    """Raises ValueError unless SQLite's integrity check passes on `path`."""
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+    finally:
+        conn.close()
+    if result != 'ok':
+        raise ValueError(f"Restored database failed its integrity check: {result}")
+
+
+def restore_database(storage, destination_path, max_workers=RESTORE_WORKERS):
+    """Rebuilds the database from the newest manifest (or the old whole-file backup).
+
+    The file is assembled next to the destination, checked against the manifest's
+    checksum and SQLite's integrity check, then renamed into place, so the
+    destination is either untouched or a complete database. Returns True if a
+    backup was restored.
+    """
+    manifest = read_manifest(storage)
+    tmp_path = f"{destination_path}.restore-{os.getpid()}.tmp"
+    try:
+        if manifest is None:
+            if not storage.download_to_filename(DESTINATION_BLOB_NAME, tmp_path):
+                return False
+        else:
+            _download_chunks(storage, manifest, tmp_path, max_workers)
+            if file_sha256(tmp_path) != manifest['sha256']:
+                raise ValueError("Restored file does not match the manifest checksum.")
+        verify_database(tmp_path)
+        os.replace(tmp_path, destination_path)
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 
 def upload_to_gcs():
-    """Uploads the local database file to the Google Cloud Storage vault."""
+    """Backs up the local database to the cloud vault, uploading only changed chunks."""
     print("--- Starting daily database backup process ---")
-    
+
     if not os.path.exists(SOURCE_FILE_NAME):
         print(f"Error: Source file not found at '{SOURCE_FILE_NAME}'. Skipping backup.")
         return
 
     try:
-        storage_client = storage.Client.from_service_account_json(CREDENTIALS_FILE)
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(DESTINATION_BLOB_NAME)
-        
-        print(f"Uploading '{SOURCE_FILE_NAME}' to Google Cloud Storage bucket '{BUCKET_NAME}'...")
-        blob.upload_from_filename(SOURCE_FILE_NAME)
-        
+        storage = get_backup_storage()
+        print(f"Backing up '{SOURCE_FILE_NAME}' to the backup vault...")
+        manifest = backup_database(storage)
         print("--- Backup successful! ---")
+        try:
+            manifests_deleted, chunks_deleted = prune_backups(storage)
+            print(f"Pruned {manifests_deleted} old snapshots and {chunks_deleted} unused chunks.")
+        except Exception as e:
+            print(f"Error pruning old backups (the new backup is fine): {e}")
+        return manifest['created_at']
 
     except Exception as e:
         print(f"!!! An error occurred during backup: {e} !!!")
 
 if __name__ == "__main__":
-    upload_to_gcs()
\ No newline at end of file
+    upload_to_gcs()
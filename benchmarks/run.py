@@ -0,0 +1,280 @@
+"""Benchmarks the site's main routes against synthetic data.
+
+    python benchmarks/run.py --articles 1000,100000 --products 30,1000
+    python benchmarks/run.py --articles 1000000 --requests 500 --gunicorn --concurrency 8
+    python benchmarks/run.py --articles 100000 --no-cache
+
+Every (articles, products) scenario runs in a fresh process through the Flask test
+client and, with --gunicorn, against a local gunicorn server. Each is measured
+twice and reported separately: with the rendered-page cache warmed, so the timed
+requests are cache hits, and with it turned off (RESPONSE_CACHE_SIZE=0), so every
+request renders. --no-cache runs only the second. Synthetic data is cached under
+benchmarks/data/ and each run writes a JSON report to benchmarks/results/ for
+comparing commits.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+PER_PAGE = 9  # Matches the homepage
+
+
+# --- Scenario data ---
+def prepare_data(article_count, product_count, data_dir):
+    """Generates (or reuses) the synthetic database and catalog. Returns (db_dir, deals_csv)."""
+    sys.path.insert(0, BENCH_DIR)
+    import synthetic
+    db_dir = os.path.join(data_dir, f'articles-{article_count}')
+    deals_csv = os.path.join(data_dir, f'deals-{product_count}.csv')
+    os.makedirs(db_dir, exist_ok=True)
+    if not os.path.exists(os.path.join(db_dir, 'content.db')):
+        print(f"Generating {article_count} synthetic articles...")
+        started = time.perf_counter()
+        synthetic.make_content_db(os.path.join(db_dir, 'content.db'), article_count)
+        print(f"   ... done in {time.perf_counter() - started:.1f}s")
+    if not os.path.exists(deals_csv):
+        synthetic.make_deals_csv(deals_csv, product_count)
+    return db_dir, deals_csv
+
+
+def route_urls(article_count, product_count, n):
+    """The URLs to request for each benchmarked route, spread over the whole dataset."""
+    step = max(1, article_count // n)
+    articles = [f'/article/{i}/synthetic-article-{i}' for i in range(1, article_count + 1, step)][:n]
+    product_step = max(1, product_count // n)
+    products = [f'/deals/product/synthetic-product-{i}' for i in range(1, product_count + 1, product_step)][:n]
+    last_page = max(2, math.ceil(article_count / PER_PAGE))
+    page_step = max(1, (last_page - 1) // n)
+    return {
+        'homepage': ['/'],
+        'page': [f'/page/{i}' for i in range(2, last_page + 1, page_step)][:n],
+        'article': articles,
+        'deals': ['/deals'],
+        'product': products,
+        'sitemap': ['/sitemap.xml'],
+    }
+
+
+# --- Measurement ---
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index] * 1000, 3)
+
+
+def measure(fetch, urls, requests_per_route, concurrency=1, warm=False):
+    """Times one cold request, then `requests_per_route` requests cycling through `urls`.
+
+    With `warm`, every URL is fetched once (untimed) first, so the timed requests are cache hits.
+    """
+    started = time.perf_counter()
+    status = fetch(urls[0])
+    cold = time.perf_counter() - started
+    if warm:
+        for url in urls[1:]:
+            fetch(url)
+
+    def timed(i):
+        t = time.perf_counter()
+        code = fetch(urls[i % len(urls)])
+        return time.perf_counter() - t, code
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed, range(requests_per_route)))
+    else:
+        results = [timed(i) for i in range(requests_per_route)]
+    wall = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'cold_ms': round(cold * 1000, 3),
+        'cold_status': status,
+        'requests': len(results),
+        'errors': sum(1 for _, code in results if code >= 400),
+        'throughput_rps': round(len(results) / wall, 1) if wall else None,
+        'p50_ms': _percentile(latencies, 50),
+        'p90_ms': _percentile(latencies, 90),
+        'p99_ms': _percentile(latencies, 99),
+        'max_ms': _percentile(latencies, 100),
+    }
+
+
+def run_test_client(args):
+    """Worker mode: runs inside a process whose environment points at one scenario's data."""
+    sys.path.insert(0, BENCH_DIR)
+    from wsgi import app
+    client = app.test_client()
+
+    def fetch(url):
+        response = client.get(url)
+        response.close()
+        return response.status_code
+
+    urls = route_urls(args.article_count, args.product_count, args.requests)
+    results = {name: measure(fetch, route, args.requests, warm=not args.uncached) for name, route in urls.items()}
+    with open(args.result_file, 'w') as f:
+        json.dump(results, f)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_gunicorn(env, article_count, product_count, args, warm):
+    import requests
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        ['gunicorn', '--workers', str(args.workers), '--threads', str(args.threads), '--bind', f'127.0.0.1:{port}',
+         '--pythonpath', f'{REPO_DIR},{BENCH_DIR}', '--log-level', 'warning', 'wsgi:app'],
+        env=env, cwd=REPO_DIR, stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if requests.get(f'{base}/ready', timeout=1).status_code == 200:
+                    break
+            except requests.ConnectionError:
+                pass
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise RuntimeError("gunicorn did not become ready")
+            time.sleep(0.2)
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+        session.mount('http://', adapter)
+
+        def fetch(url):
+            return session.get(base + url, timeout=60).status_code
+
+        urls = route_urls(article_count, product_count, args.requests)
+        return {name: measure(fetch, route, args.requests, args.concurrency, warm) for name, route in urls.items()}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+# Report key suffix -> whether the rendered-page cache is on.
+CACHE_MODES = {'': True, '_no_cache': False}
+
+
+def run_scenario(article_count, product_count, args):
+    db_dir, deals_csv = prepare_data(article_count, product_count, args.data_dir)
+    scenario = {'articles': article_count, 'products': product_count}
+    for suffix, cached in CACHE_MODES.items():
+        if cached and args.no_cache:
+            continue
+        env = dict(os.environ, RENDER_DISK_PATH=db_dir, BENCH_DEALS_CSV=deals_csv)
+        env.pop('RESPONSE_CACHE_DIR', None)
+        if not cached:
+            env['RESPONSE_CACHE_SIZE'] = '0'
+
+        fd, result_file = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker', '--result-file', result_file,
+                 '--article-count', str(article_count), '--product-count', str(product_count),
+                 '--requests', str(args.requests)] + ([] if cached else ['--uncached']),
+                env=env, cwd=REPO_DIR, check=True, stdout=subprocess.DEVNULL)
+            with open(result_file) as f:
+                scenario['test_client' + suffix] = json.load(f)
+        finally:
+            os.remove(result_file)
+
+        if args.gunicorn:
+            if shutil.which('gunicorn'):
+                scenario['gunicorn' + suffix] = run_gunicorn(env, article_count, product_count, args, warm=cached)
+            else:
+                scenario['gunicorn' + suffix] = {'skipped': 'gunicorn is not installed'}
+    return scenario
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_summary(scenario):
+    print(f"\n== {scenario['articles']} articles, {scenario['products']} products ==")
+    for mode in (runner + suffix for runner in ('test_client', 'gunicorn') for suffix in CACHE_MODES):
+        routes = scenario.get(mode)
+        if not routes or 'skipped' in routes:
+            continue
+        print(f"  [{mode}]")
+        for name, r in routes.items():
+            print(f"    {name:<9} cold {r['cold_ms']:>9.1f}ms  p50 {r['p50_ms']:>8.2f}ms  p99 {r['p99_ms']:>8.2f}ms  "
+                  f"{r['throughput_rps']:>8.1f} req/s  errors {r['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Flask routes against synthetic data.")
+    parser.add_argument('--articles', default='1000', help="Comma-separated article counts, e.g. 1000,100000,1000000")
+    parser.add_argument('--products', default='30', help="Comma-separated product counts for deals.csv")
+    parser.add_argument('--requests', type=int, default=200, help="Measured requests per route")
+    parser.add_argument('--gunicorn', action='store_true', help="Also benchmark a local gunicorn server")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent clients against gunicorn")
+    parser.add_argument('--no-cache', action='store_true', help="Only measure with the rendered-page cache turned off")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="Where synthetic data is generated and cached")
+    parser.add_argument('--output', help="Report path (default: benchmarks/results/<time>-<commit>.json)")
+    # Internal: one scenario measured through the test client in a child process.
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    parser.add_argument('--article-count', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--product-count', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--uncached', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_test_client(args)
+        return
+
+    commit = _git_commit()
+    started_at = datetime.now(timezone.utc)
+    report = {
+        'started_at': started_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {'requests_per_route': args.requests, 'gunicorn_workers': args.workers,
+                     'gunicorn_threads': args.threads, 'concurrency': args.concurrency, 'no_cache': args.no_cache},
+        'scenarios': [],
+    }
+    for article_count in (int(n) for n in args.articles.split(',')):
+        for product_count in (int(n) for n in args.products.split(',')):
+            scenario = run_scenario(article_count, product_count, args)
+            report['scenarios'].append(scenario)
+            _print_summary(scenario)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{started_at.strftime('%Y%m%dT%H%M%SZ')}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import csv
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from product_catalog import PRODUCT_FIELDS
+
+# --- Synthetic Data ---
+# Deterministic (seeded) fake articles and products shaped like the real ones, so
+# benchmark runs at the same size are comparable across commits.
+
+WORDS = ('ai startup phone india market chip cloud budget election cricket tech gadget policy robot '
+         'battery launch price review rupee bank monsoon metro satellite privacy court streaming '
+         'laptop camera data security telecom railway stock factory export solar ev').split()
+CATEGORIES = ('Tech', 'Kitchen', 'Home Appliances', 'Other')
+START_DATE = datetime(2024, 1, 1)
+
+
+def _sentence(rng, n):
+    return ' '.join(rng.choices(WORDS, k=n)).capitalize() + '.'
+
+
+def _article_rows(count, rng):
+    for i in range(1, count + 1):
+        headline = ' '.join(rng.sample(WORDS, 7)).title()
+        commentary = ' '.join(_sentence(rng, 15) for _ in range(6)) + '\n\n' + ' '.join(_sentence(rng, 15) for _ in range(6))
+        # Roughly one article every ten minutes, ids in timestamp order like real ingests.
+        timestamp = (START_DATE + timedelta(minutes=10 * i)).strftime('%Y-%m-%d %H:%M:%S')
+        yield (headline, commentary, f'https://news.example.com/{i}', f'https://img.example.com/{i}.jpg',
+               timestamp, f'synthetic-article-{i}', _sentence(rng, 20)[:155], f'Image for {headline}',
+               ', '.join(rng.sample(WORDS, 6)))
+
+
+def make_content_db(path, article_count, seed=42):
+    """Writes a fresh content.db with `article_count` articles and the full current schema."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(database.ARTICLES_TABLE_SQL)
+        for column, definition in database.ARTICLE_COLUMN_MIGRATIONS:
+            conn.execute(f'ALTER TABLE articles ADD COLUMN {column} {definition}')
+        # Bulk-load before the triggers exist; ensure_schema() then builds the
+        # indexes, counters and search index in one pass.
+        conn.executemany(
+            'INSERT INTO articles (headline, commentary, article_url, image_url, timestamp, slug, '
+            'meta_description, image_alt_text, seo_keywords) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            _article_rows(article_count, rng))
+        conn.commit()
+        database.ensure_schema(conn)
+        conn.execute('PRAGMA journal_mode=WAL')
+    finally:
+        conn.close()
+
+
+def make_deals_csv(path, product_count, seed=42):
+    """Writes a deals.csv with `product_count` products in the storefront's column layout."""
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=PRODUCT_FIELDS)
+        writer.writeheader()
+        for i in range(1, product_count + 1):
+            name = ' '.join(rng.sample(WORDS, 4)).title()
+            writer.writerow({
+                'slug': f'synthetic-product-{i}',
+                'title': f'{name} {i}',
+                'price': f'{rng.randint(299, 99999):,}',
+                'image_url': f'https://img.example.com/p{i}.jpg',
+                'affiliate_link': f'https://amzn.example.com/{i}',
+                'category': rng.choice(CATEGORIES),
+                'keywords': ', '.join(rng.sample(WORDS, 5)),
+                'pros': '; '.join(_sentence(rng, 5) for _ in range(3)),
+                'cons': '; '.join(_sentence(rng, 5) for _ in range(2)),
+                'description': _sentence(rng, 40) + '\n' + _sentence(rng, 40),
+            })
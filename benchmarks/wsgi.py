@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --- Benchmark App ---
+# The site with deals.csv taken from BENCH_DEALS_CSV (serving pages makes no outbound API calls).
+# RENDER_DISK_PATH must point at the synthetic data directory before this is imported.
+# Used by the in-process runner and as the gunicorn entry point (wsgi:app).
+
+
+def load_app():
+    import app as site
+    from product_catalog import ProductCatalog
+
+    if os.getenv('BENCH_DEALS_CSV'):
+        site.PRODUCT_CATALOG = ProductCatalog(os.environ['BENCH_DEALS_CSV'])
+    return site.app
+
+
+app = load_app()
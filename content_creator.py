@@ -1,105 +1,270 @@
+import argparse
 import os
-import requests
+import re
 import json
-import sqlite3
 import random
-from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
 from newsapi import NewsApiClient
+from database import connect, derive_article_fields
+from images import create_article_thumbnails
+import http_client
+from related_articles import update_related_articles
+from topics import assign_topic
+from product_catalog import DEALS_CSV_PATH, ProductCatalog
+from sitemap_writer import write_sitemaps
 
-DB_PATH = os.path.join(os.getenv('RENDER_DISK_PATH', '.'), 'content.db')
+KEYWORDS_SYSTEM_PROMPT = "You are an SEO expert. Your task is to provide a list of 5-7 relevant keywords for a given news headline. The keywords should be lowercase. Your entire response must be ONLY a comma-separated string of these keywords, with no other text."
+KEYWORDS_DEADLINE = 30  # seconds
 
-def fetch_and_save_content():
-    print("--- Running the v2.0 AI Content Journalist ---")
-    
-    # --- 1. Fetch a headline (Unchanged) ---
+def generate_seo_keywords(headline):
+    """Calls Perplexity to generate SEO keywords for a headline."""
+    print(f"Asking AI for SEO keywords for: '{headline}'...")
     try:
-        print("Fetching a recent headline from NewsAPI...")
-        # ... (This whole NewsAPI section is the same and is correct)
-        news_api_key = os.getenv("NEWS_API_KEY")
-        if not news_api_key: raise Exception("NEWS_API_KEY not set.")
-        newsapi = NewsApiClient(api_key=news_api_key)
-        keywords = 'tech OR gadget OR smartphone OR AI OR startup OR geopolitics'
-        sources = 'the-times-of-india,the-hindu,google-news-in'
-        yesterday = (date.today() - timedelta(days=1)).isoformat()
-        all_articles = newsapi.get_everything(q=keywords, sources=sources, language='en', from_param=yesterday, sort_by='relevancy', page_size=50)
-        articles = all_articles.get("articles")
-        if not articles: raise Exception("No recent articles found.")
-        random_article = random.choice(articles)
-        headline = random_article.get('title')
-        url = random_article.get('url')
-        image_url = random_article.get('urlToImage')
-        if not all([headline, url, image_url]): raise Exception("Article was missing data.")
-        print(f"Found article: {headline}")
+        user_prompt = f"Generate the comma-separated keywords for this headline: {headline}"
+        keywords_str = http_client.chat_completion(KEYWORDS_SYSTEM_PROMPT, user_prompt, deadline=KEYWORDS_DEADLINE).strip()
+        print(f"Generated keywords: {keywords_str}")
+        return keywords_str
     except Exception as e:
-        print(f"Error fetching from NewsAPI: {e}"); return
+        print(f"Error generating SEO keywords: {e}"); return ""
+
+def normalize_keywords(keywords):
+    """Turns the AI's keyword answer (a string or a list) into one lowercase comma-separated string."""
+    if isinstance(keywords, (list, tuple)):
+        keywords = ", ".join(str(k) for k in keywords)
+    return ", ".join(k.strip().lower() for k in (keywords or "").split(",") if k.strip())
+
+def save_seo_keywords(conn, article_id, keywords):
+    """Stores generated keywords on an existing article row, re-assigning its topic with them."""
+    row = conn.execute('SELECT headline FROM articles WHERE id = ?', (article_id,)).fetchone()
+    if row is None: return
+    conn.execute('UPDATE articles SET seo_keywords = ?, topic = ? WHERE id = ?',
+                 (keywords, assign_topic(row['headline'], keywords), article_id))
+    conn.commit()
 
-    # --- 2. Get Structured AI Content from Perplexity (Corrected Prompt) ---
+def backfill_seo_keywords(limit=None):
+    """Generates and stores keywords for every article that doesn't have any yet."""
+    conn = connect()
     try:
-        print("Getting structured AI content from Perplexity...")
-        pplx_api_key = os.getenv("PPLX_API_KEY")
-        if not pplx_api_key: raise Exception("PPLX_API_KEY not set.")
-        
-        # This is our new prompt that ASKS FOR METADATA *in addition to* our two-paragraph commentary
-        system_prompt = (
-            "You are a witty and insightful analyst. Your task is to generate a complete article package for a news headline. "
-            "Your entire response must be a single, valid JSON object with no other text.\n\n"
-            "The JSON object must have these exact keys:\n"
-            "- `commentary`: A 2-paragraph blog post. Paragraph 1 is a witty 'hot take'. Paragraph 2 provides informative SEO-friendly context.\n"
-            "- `meta_description`: A 155-character, SEO-optimized summary for Google search results.\n"
-            "- `slug`: A lowercase, hyphen-separated URL slug (e.g., 'delhi-bs4-ban-explained').\n"
-            "- `image_alt_text`: A short, descriptive alt text for the article's main image."
-        )
-        user_prompt = f"Generate the structured JSON for this headline: {headline}"
-        
-        api_url = "https://api.perplexity.ai/chat/completions"
-        headers = {"accept": "application/json", "content-type": "application/json", "authorization": f"Bearer {pplx_api_key}"}
-        payload = {"model": "sonar", "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]}
-        
-        response = requests.post(api_url, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        
-        # Clean the response to ensure it's valid JSON
-        ai_response_text = response.json()['choices'][0]['message']['content']
-        # Find the start and end of the JSON object to be safe
-        json_start = ai_response_text.find('{')
-        json_end = ai_response_text.rfind('}') + 1
-        json_str = ai_response_text[json_start:json_end]
-        
-        ai_data = json.loads(json_str)
-        print("Successfully generated structured AI content.")
+        query = "SELECT id, headline FROM articles WHERE seo_keywords IS NULL OR seo_keywords = '' ORDER BY id DESC"
+        params = ()
+        if limit:
+            query += ' LIMIT ?'; params = (limit,)
+        rows = conn.execute(query, params).fetchall()
+        print(f"Backfilling SEO keywords for {len(rows)} articles...")
+        filled = 0
+        for row in rows:
+            keywords = normalize_keywords(generate_seo_keywords(row['headline']))
+            if keywords:
+                save_seo_keywords(conn, row['id'], keywords); filled += 1
+    finally:
+        conn.close()
+    print(f"Backfill complete: {filled}/{len(rows)} articles now have keywords.")
+    return filled
+
+def store_article_thumbnails(conn, image_urls):
+    """Downloads and resizes article images concurrently, then records the thumbnails. `image_urls` maps id -> URL."""
+    if not image_urls: return 0
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(image_urls))) as executor:
+        results = dict(zip(image_urls, executor.map(lambda pair: create_article_thumbnails(http_client.get_session(), *pair), image_urls.items())))
+    # Images that failed are stored as '{}' too, so the backfill doesn't try them again.
+    rows = [(json.dumps(thumbnails), article_id) for article_id, thumbnails in results.items() if thumbnails is not None]
+    conn.executemany('UPDATE articles SET thumbnails = ? WHERE id = ?', rows)
+    conn.commit()
+    return sum(1 for thumbnails in results.values() if thumbnails)
+
+def backfill_thumbnails(limit=None):
+    """Creates card thumbnails for every article that doesn't have them yet."""
+    conn = connect()
+    try:
+        query = "SELECT id, image_url FROM articles WHERE thumbnails IS NULL AND image_url IS NOT NULL ORDER BY id DESC"
+        params = ()
+        if limit:
+            query += ' LIMIT ?'; params = (limit,)
+        image_urls = {row['id']: row['image_url'] for row in conn.execute(query, params)}
+        print(f"Creating thumbnails for {len(image_urls)} articles...")
+        filled = store_article_thumbnails(conn, image_urls)
+        print(f"Backfill complete: {filled}/{len(image_urls)} articles now have thumbnails.")
+        return filled
+    finally:
+        conn.close()
+
+# --- Batch ingestion settings ---
+# One cron run can write several articles: their AI packages are generated
+# concurrently (through http_client's pooled session), then saved in a single transaction.
+DEFAULT_BATCH_SIZE = int(os.getenv("JOURNALIST_BATCH_SIZE", "1"))
+MAX_BATCH_SIZE = 20
+MAX_CONCURRENT_REQUESTS = 4
+ARTICLE_DEADLINE = 180  # seconds per article package, retries included
+
+ARTICLE_SYSTEM_PROMPT = (
+    "You are a witty and insightful analyst. Your task is to generate a complete article package for a news headline. "
+    "Your entire response must be a single, valid JSON object with no other text.\n\n"
+    "The JSON object must have these exact keys:\n"
+    "- `commentary`: A 2-paragraph blog post. Paragraph 1 is a witty 'hot take'. Paragraph 2 provides informative SEO-friendly context.\n"
+    "- `meta_description`: A 155-character, SEO-optimized summary for Google search results.\n"
+    "- `slug`: A lowercase, hyphen-separated URL slug (e.g., 'delhi-bs4-ban-explained').\n"
+    "- `image_alt_text`: A short, descriptive alt text for the article's main image.\n"
+    "- `seo_keywords`: A comma-separated string of 5-7 lowercase SEO keywords for the headline."
+)
+
+def fetch_candidate_headlines():
+    """Fetches recent headlines from NewsAPI, keeping only ones with a title, URL and image."""
+    print("Fetching recent headlines from NewsAPI...")
+    news_api_key = os.getenv("NEWS_API_KEY")
+    if not news_api_key: raise Exception("NEWS_API_KEY not set.")
+    newsapi = NewsApiClient(api_key=news_api_key)
+    keywords = 'tech OR gadget OR smartphone OR AI OR startup OR geopolitics'
+    sources = 'the-times-of-india,the-hindu,google-news-in'
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    all_articles = newsapi.get_everything(q=keywords, sources=sources, language='en', from_param=yesterday, sort_by='relevancy', page_size=50)
+    articles = all_articles.get("articles")
+    if not articles: raise Exception("No recent articles found.")
+    candidates, seen = [], set()
+    for article in articles:
+        headline, url, image_url = article.get('title'), article.get('url'), article.get('urlToImage')
+        if not all([headline, url, image_url]) or url in seen or headline.lower() in seen:
+            continue
+        seen.update([url, headline.lower()])
+        candidates.append({'headline': headline, 'url': url, 'image_url': image_url})
+    return candidates
+
+def remove_already_published(conn, candidates):
+    """Drops candidates whose source URL is already in the articles table."""
+    if not candidates: return candidates
+    urls = [c['url'] for c in candidates]
+    placeholders = ', '.join('?' * len(urls))
+    existing = {row[0] for row in conn.execute(f'SELECT article_url FROM articles WHERE article_url IN ({placeholders})', urls)}
+    return [c for c in candidates if c['url'] not in existing]
+
+def parse_article_package(ai_response_text):
+    """Pulls the JSON object out of the AI's answer and checks it has every required key."""
+    # Find the start and end of the JSON object to be safe
+    json_start = ai_response_text.find('{')
+    json_end = ai_response_text.rfind('}') + 1
+    ai_data = json.loads(ai_response_text[json_start:json_end])
+    missing = [key for key in ('commentary', 'meta_description', 'slug', 'image_alt_text') if not ai_data.get(key)]
+    if missing: raise Exception(f"AI response was missing {', '.join(missing)}.")
+    return ai_data
+
+def generate_article_package(headline):
+    """Asks Perplexity for the commentary, metadata and keywords for one headline."""
+    user_prompt = f"Generate the structured JSON for this headline: {headline}"
+    ai_data = http_client.chat_completion(ARTICLE_SYSTEM_PROMPT, user_prompt, parse=parse_article_package, deadline=ARTICLE_DEADLINE)
+
+    # Keywords are computed once here so article pages never have to ask the AI for them.
+    ai_data['seo_keywords'] = normalize_keywords(ai_data.get('seo_keywords')) or normalize_keywords(generate_seo_keywords(headline))
+    return ai_data
+
+def unique_slug(slug, taken):
+    """Returns `slug`, or `slug-2`, `slug-3`... if it's already taken. Adds the result to `taken`."""
+    base = slugify(slug)
+    candidate, n = base, 2
+    while candidate in taken:
+        candidate = f"{base}-{n}"; n += 1
+    taken.add(candidate)
+    return candidate
+
+def slugify(text):
+    return re.sub(r'[^a-z0-9]+', '-', (text or '').lower()).strip('-') or 'article'
+
+def fetch_and_save_content(batch_size=None):
+    """Writes up to `batch_size` new AI articles. Returns the list of new article ids."""
+    batch_size = max(1, min(batch_size or DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE))
+    print(f"--- Running the v2.1 AI Content Journalist (batch of {batch_size}) ---")
+    
+    # --- 1. Pick fresh headlines we haven't written about yet ---
+    try:
+        candidates = fetch_candidate_headlines()
+        conn = connect()
+        try:
+            candidates = remove_already_published(conn, candidates)
+        finally:
+            conn.close()
+        if not candidates: raise Exception("Every recent headline has already been published.")
+        picked = random.sample(candidates, min(batch_size, len(candidates)))
+        for item in picked:
+            print(f"Found article: {item['headline']}")
     except Exception as e:
-        print(f"Error getting AI content: {e}"); return
+        print(f"Error fetching from NewsAPI: {e}"); return []
+
+    # --- 2. Generate the AI packages concurrently ---
+    print(f"Getting structured AI content from Perplexity for {len(picked)} headlines...")
+    packages = []
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(picked))) as executor:
+        futures = {executor.submit(generate_article_package, item['headline']): item for item in picked}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                packages.append((item, future.result()))
+                print(f"   ... generated: {item['headline']}")
+            except Exception as e:
+                print(f"Error getting AI content for '{item['headline']}': {e}")
+    if not packages:
+        print("No AI content was generated. Nothing to save."); return []
 
-    # --- 3. Save the NEW, structured data to the database ---
+    # --- 3. Save every article in one transaction ---
+    conn = None
+    article_ids = []
     try:
-        print("Saving new structured content to the database...")
-        conn = sqlite3.connect(DB_PATH)
+        print(f"Saving {len(packages)} new articles to the database...")
+        conn = connect()
         cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS articles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                headline TEXT NOT NULL,
-                commentary TEXT NOT NULL,
-                article_url TEXT,
-                image_url TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                slug TEXT UNIQUE,
-                meta_description TEXT,
-                image_alt_text TEXT
+        taken_slugs = set()
+        for item, ai_data in packages:
+            slug = unique_slug(ai_data['slug'], taken_slugs)
+            while cursor.execute('SELECT 1 FROM articles WHERE slug = ?', (slug,)).fetchone():
+                slug = unique_slug(ai_data['slug'], taken_slugs)
+            # The timestamp is set here (same format as CURRENT_TIMESTAMP) so the display fields can be derived from it.
+            timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            derived = derive_article_fields(ai_data['commentary'], timestamp)
+            cursor.execute(
+                'INSERT INTO articles (headline, commentary, article_url, image_url, slug, meta_description, image_alt_text, seo_keywords, '
+                'timestamp, reading_time, commentary_paras, display_date, summary, topic) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (item['headline'], ai_data['commentary'], item['url'], item['image_url'], slug, ai_data['meta_description'], ai_data['image_alt_text'], ai_data['seo_keywords'],
+                 timestamp, derived['reading_time'], derived['commentary_paras'], derived['display_date'], derived['summary'],
+                 assign_topic(item['headline'], ai_data['seo_keywords']))
             )
-        ''')
-        
-        cursor.execute(
-            'INSERT INTO articles (headline, commentary, article_url, image_url, slug, meta_description, image_alt_text) VALUES (?, ?, ?, ?, ?, ?, ?)',
-            (headline, ai_data['commentary'], url, image_url, ai_data['slug'], ai_data['meta_description'], ai_data['image_alt_text'])
-        )
-        
+            article_ids.append(cursor.lastrowid)
         conn.commit()
-        conn.close()
         print("Content saved successfully!")
     except Exception as e:
         print(f"Error saving to database: {e}")
+        if conn:
+            conn.rollback(); conn.close()
+        return []
+
+    # --- 4. Store card-sized thumbnails of the article images ---
+    try:
+        image_urls = {article_id: item['image_url'] for article_id, (item, _) in zip(article_ids, packages)}
+        store_article_thumbnails(conn, image_urls)
+    except Exception as e:
+        print(f"Error creating thumbnails: {e}")
+
+    # --- 5. Link the new articles to their most similar neighbours ---
+    try:
+        for article_id in article_ids:
+            update_related_articles(conn, article_id)
+    except Exception as e:
+        print(f"Error updating related articles: {e}")
+
+    # --- 6. Add the new articles to the pre-generated sitemap ---
+    try:
+        write_sitemaps(conn, ProductCatalog(DEALS_CSV_PATH))
+    except Exception as e:
+        print(f"Error updating sitemaps: {e}")
+    finally:
+        conn.close()
+
+    # --- 7. Drop expired AI answers from the prompt cache ---
+    try:
+        pruned = http_client.prune_prompt_cache()
+        if pruned: print(f"Pruned {pruned} expired answers from the prompt cache.")
+    except Exception as e:
+        print(f"Error pruning the prompt cache: {e}")
+    return article_ids
 
 if __name__ == "__main__":
-    fetch_and_save_content()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Write new AI articles from today's headlines.")
+    parser.add_argument('--batch', type=int, default=None, help=f"How many articles to write (max {MAX_BATCH_SIZE}).")
+    fetch_and_save_content(batch_size=parser.parse_args().batch)
@@ -0,0 +1,426 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from topics import DEFAULT_TOPIC, assign_topic
+
+# --- This is the "smart path" to our database ---
+DB_PATH = os.path.join(os.getenv('RENDER_DISK_PATH', '.'), 'content.db')
+
+ARTICLES_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS articles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        headline TEXT NOT NULL,
+        commentary TEXT NOT NULL,
+        article_url TEXT,
+        image_url TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        slug TEXT UNIQUE,
+        meta_description TEXT,
+        image_alt_text TEXT
+    )
+'''
+
+# Columns added to `articles` after the original schema shipped.
+# Older databases get them via ALTER TABLE the first time ensure_schema() runs.
+ARTICLE_COLUMN_MIGRATIONS = [
+    ('seo_keywords', 'TEXT'),
+    # Derived from commentary/timestamp when the row is written (see derive_article_fields).
+    ('reading_time', 'TEXT'),
+    ('commentary_paras', 'TEXT'),  # JSON array of paragraphs
+    ('display_date', 'TEXT'),
+    ('summary', 'TEXT'),           # The first paragraph, shown on cards
+    ('thumbnails', 'TEXT'),        # JSON {width: filename} of card images stored under media/
+    ('revision', 'INTEGER NOT NULL DEFAULT 0'),  # Bumped on every UPDATE; keys the template fragment cache
+    ('topic', 'TEXT'),             # A slug from topics.TOPICS, assigned at ingest
+]
+
+# What list pages (homepage cards, related articles) need, without the full commentary.
+ARTICLE_CARD_COLUMNS = 'id, slug, headline, image_url, image_alt_text, timestamp, display_date, reading_time, summary, thumbnails, revision'
+
+# Indexes, side tables and triggers. Every statement must be idempotent.
+SCHEMA_STATEMENTS = [
+    # Serves the homepage's ORDER BY timestamp DESC, id DESC and keyset seeks on it.
+    'CREATE INDEX IF NOT EXISTS idx_articles_timestamp_id ON articles (timestamp, id)',
+    # Lets the journalist skip headlines it has already written about.
+    'CREATE INDEX IF NOT EXISTS idx_articles_article_url ON articles (article_url)',
+    # Tiny partial index: finds rows still missing their derived fields without a table scan.
+    'CREATE INDEX IF NOT EXISTS idx_articles_missing_display ON articles (id) WHERE display_date IS NULL',
+    # Serves /topic/<slug>: one topic's articles, newest first.
+    'CREATE INDEX IF NOT EXISTS idx_articles_topic_timestamp_id ON articles (topic, timestamp, id)',
+    'CREATE INDEX IF NOT EXISTS idx_articles_missing_topic ON articles (id) WHERE topic IS NULL',
+
+    # A single-row table holding the article count, kept current by triggers,
+    # so pagination never needs a COUNT(*) over the whole table.
+    '''CREATE TABLE IF NOT EXISTS article_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        article_count INTEGER NOT NULL
+    )''',
+    'INSERT OR IGNORE INTO article_stats (id, article_count) SELECT 1, COUNT(*) FROM articles',
+    '''CREATE TRIGGER IF NOT EXISTS article_stats_after_insert AFTER INSERT ON articles BEGIN
+        UPDATE article_stats SET article_count = article_count + 1 WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS article_stats_after_delete AFTER DELETE ON articles BEGIN
+        UPDATE article_stats SET article_count = article_count - 1 WHERE id = 1;
+    END''',
+
+    # A version number bumped by every change to `articles`. Rendered-page caches in
+    # every worker compare against it, so an ingest from any process invalidates them.
+    '''CREATE TABLE IF NOT EXISTS content_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )''',
+    'INSERT OR IGNORE INTO content_version (id, version) VALUES (1, 1)',
+    '''CREATE TRIGGER IF NOT EXISTS content_version_after_insert AFTER INSERT ON articles BEGIN
+        UPDATE content_version SET version = version + 1 WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS content_version_after_update AFTER UPDATE ON articles BEGIN
+        UPDATE content_version SET version = version + 1 WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS content_version_after_delete AFTER DELETE ON articles BEGIN
+        UPDATE content_version SET version = version + 1 WHERE id = 1;
+    END''',
+
+    # Every change to a row bumps its revision, so cached fragments of it go stale.
+    # The WHEN clause stops the trigger's own UPDATE from firing it again.
+    '''CREATE TRIGGER IF NOT EXISTS articles_revision_after_update AFTER UPDATE ON articles
+    WHEN NEW.revision = OLD.revision BEGIN
+        UPDATE articles SET revision = OLD.revision + 1 WHERE id = NEW.id;
+    END''',
+
+    # Precomputed neighbour lists, filled by related_articles.py at ingest time.
+    '''CREATE TABLE IF NOT EXISTS related_articles (
+        article_id INTEGER NOT NULL,
+        related_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (article_id, related_id)
+    ) WITHOUT ROWID''',
+    '''CREATE TRIGGER IF NOT EXISTS related_articles_after_delete AFTER DELETE ON articles BEGIN
+        DELETE FROM related_articles WHERE article_id = OLD.id OR related_id = OLD.id;
+    END''',
+
+    # Article counts per month ('2025-10') and topic, kept current by triggers, so the
+    # archive's month and topic lists and its pagination never count over `articles`.
+    # Filled once from the existing rows when the table is created; rows missing a
+    # topic count as the default one until they get theirs.
+    '''CREATE TABLE IF NOT EXISTS archive_counts (
+        month TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        article_count INTEGER NOT NULL,
+        PRIMARY KEY (month, topic)
+    ) WITHOUT ROWID''',
+    f'''INSERT INTO archive_counts (month, topic, article_count)
+        SELECT substr(timestamp, 1, 7), COALESCE(topic, '{DEFAULT_TOPIC}'), COUNT(*) FROM articles
+        WHERE NOT EXISTS (SELECT 1 FROM archive_counts)
+        GROUP BY 1, 2''',
+    f'''CREATE TRIGGER IF NOT EXISTS archive_counts_after_insert AFTER INSERT ON articles BEGIN
+        INSERT INTO archive_counts (month, topic, article_count)
+        VALUES (substr(NEW.timestamp, 1, 7), COALESCE(NEW.topic, '{DEFAULT_TOPIC}'), 1)
+        ON CONFLICT (month, topic) DO UPDATE SET article_count = article_count + 1;
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS archive_counts_after_delete AFTER DELETE ON articles BEGIN
+        UPDATE archive_counts SET article_count = article_count - 1
+        WHERE month = substr(OLD.timestamp, 1, 7) AND topic = COALESCE(OLD.topic, '{DEFAULT_TOPIC}');
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS archive_counts_after_update AFTER UPDATE OF timestamp, topic ON articles
+    WHEN substr(OLD.timestamp, 1, 7) IS NOT substr(NEW.timestamp, 1, 7) OR OLD.topic IS NOT NEW.topic BEGIN
+        UPDATE archive_counts SET article_count = article_count - 1
+        WHERE month = substr(OLD.timestamp, 1, 7) AND topic = COALESCE(OLD.topic, '{DEFAULT_TOPIC}');
+        INSERT INTO archive_counts (month, topic, article_count)
+        VALUES (substr(NEW.timestamp, 1, 7), COALESCE(NEW.topic, '{DEFAULT_TOPIC}'), 1)
+        ON CONFLICT (month, topic) DO UPDATE SET article_count = article_count + 1;
+    END''',
+
+    # Page views per article per UTC day, written in batches by article_views.py.
+    # A separate table, so counting views never touches content_version or revisions.
+    '''CREATE TABLE IF NOT EXISTS article_views (
+        article_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        views INTEGER NOT NULL,
+        PRIMARY KEY (article_id, day)
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS idx_article_views_day ON article_views (day)',
+    '''CREATE TRIGGER IF NOT EXISTS article_views_after_delete AFTER DELETE ON articles BEGIN
+        DELETE FROM article_views WHERE article_id = OLD.id;
+    END''',
+]
+
+# Full-text search over articles (FTS5, external-content so text isn't stored twice).
+# Kept in sync with `articles` by triggers; skipped if SQLite was built without FTS5.
+SEARCH_TABLE_SQL = '''
+    CREATE VIRTUAL TABLE articles_fts USING fts5(
+        headline, commentary, meta_description, seo_keywords,
+        content='articles', content_rowid='id', tokenize='porter unicode61'
+    )
+'''
+SEARCH_TRIGGER_STATEMENTS = [
+    '''CREATE TRIGGER IF NOT EXISTS articles_fts_after_insert AFTER INSERT ON articles BEGIN
+        INSERT INTO articles_fts (rowid, headline, commentary, meta_description, seo_keywords)
+        VALUES (NEW.id, NEW.headline, NEW.commentary, NEW.meta_description, NEW.seo_keywords);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS articles_fts_after_delete AFTER DELETE ON articles BEGIN
+        INSERT INTO articles_fts (articles_fts, rowid, headline, commentary, meta_description, seo_keywords)
+        VALUES ('delete', OLD.id, OLD.headline, OLD.commentary, OLD.meta_description, OLD.seo_keywords);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS articles_fts_after_update
+    AFTER UPDATE OF headline, commentary, meta_description, seo_keywords ON articles BEGIN
+        INSERT INTO articles_fts (articles_fts, rowid, headline, commentary, meta_description, seo_keywords)
+        VALUES ('delete', OLD.id, OLD.headline, OLD.commentary, OLD.meta_description, OLD.seo_keywords);
+        INSERT INTO articles_fts (rowid, headline, commentary, meta_description, seo_keywords)
+        VALUES (NEW.id, NEW.headline, NEW.commentary, NEW.meta_description, NEW.seo_keywords);
+    END''',
+]
+
+
+# --- Derived article fields ---
+WORDS_PER_MINUTE = 200
+DISPLAY_DATE_FORMAT = '%B %d, %Y'
+BACKFILL_BATCH_SIZE = 1000
+
+
+def reading_time(text):
+    """Estimates the reading time for a piece of text."""
+    if not text: return "1 min read"
+    return f"{max(1, round(len(text.split()) / WORDS_PER_MINUTE))} min read"
+
+
+def format_display_date(timestamp):
+    """'2025-10-17 08:00:00' (optionally with fractional seconds) -> 'October 17, 2025'."""
+    if not timestamp: return ""
+    try: date_obj = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S.%f')
+    except ValueError: date_obj = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+    return date_obj.strftime(DISPLAY_DATE_FORMAT)
+
+
+def derive_article_fields(commentary, timestamp):
+    """Everything pages show that can be computed once, when the article is written."""
+    paras = [p.strip() for p in (commentary or '').split('\n') if p.strip()]
+    return {
+        'reading_time': reading_time(commentary),
+        'commentary_paras': json.dumps(paras),
+        'display_date': format_display_date(timestamp),
+        'summary': paras[0] if paras else '',
+    }
+
+
+def refresh_derived_fields(cursor, only_missing=True):
+    """Fills the derived columns for articles that don't have them yet (or for all of them)."""
+    last_id, updated = 0, 0
+    where = 'AND display_date IS NULL' if only_missing else ''
+    while True:
+        rows = cursor.execute(
+            f'SELECT id, commentary, timestamp FROM articles WHERE id > ? {where} ORDER BY id LIMIT ?',
+            (last_id, BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows: return updated
+        batch = []
+        for article_id, commentary, timestamp in rows:
+            try: fields = derive_article_fields(commentary, timestamp)
+            except ValueError: fields = derive_article_fields(commentary, None)  # Unparseable timestamp
+            batch.append((fields['reading_time'], fields['commentary_paras'], fields['display_date'], fields['summary'], article_id))
+        cursor.executemany(
+            'UPDATE articles SET reading_time = ?, commentary_paras = ?, display_date = ?, summary = ? WHERE id = ?', batch
+        )
+        updated += len(batch)
+        last_id = rows[-1][0]
+
+
+def assign_topics(cursor, only_missing=True):
+    """Sets the topic of articles that don't have one yet (or of all of them). Returns how many changed."""
+    last_id, updated = 0, 0
+    where = 'AND topic IS NULL' if only_missing else ''
+    while True:
+        rows = cursor.execute(
+            f'SELECT id, headline, seo_keywords, topic FROM articles WHERE id > ? {where} ORDER BY id LIMIT ?',
+            (last_id, BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows: return updated
+        batch = []
+        for article_id, headline, seo_keywords, topic in rows:
+            new_topic = assign_topic(headline, seo_keywords)
+            if new_topic != topic: batch.append((new_topic, article_id))
+        cursor.executemany('UPDATE articles SET topic = ? WHERE id = ?', batch)
+        updated += len(batch)
+        last_id = rows[-1][0]
+
+
+def _ensure_search_schema(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articles_fts'")
+    if cursor.fetchone() is None:
+        try:
+            cursor.execute(SEARCH_TABLE_SQL)
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable (SQLite without FTS5?): {e}")
+            return
+        # A brand-new index starts empty, so fill it from the existing articles.
+        print("Building the full-text search index...")
+        cursor.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+    for statement in SEARCH_TRIGGER_STATEMENTS:
+        cursor.execute(statement)
+
+
+def rebuild_search_index(conn):
+    """Rebuilds the full-text index from the articles table (e.g. after a bulk import)."""
+    conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('optimize')")
+    conn.commit()
+
+
+def ensure_schema(conn):
+    """Creates the articles table if needed and applies any missing migrations.
+
+    Runs inside one IMMEDIATE transaction so several workers starting at once
+    can't race each other into a duplicate ALTER TABLE.
+    """
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute(ARTICLES_TABLE_SQL)
+        existing_columns = {row[1] for row in cursor.execute('PRAGMA table_info(articles)')}
+        for column, definition in ARTICLE_COLUMN_MIGRATIONS:
+            if column not in existing_columns:
+                print(f"Migrating database: adding column '{column}' to articles...")
+                cursor.execute(f'ALTER TABLE articles ADD COLUMN {column} {definition}')
+        for statement in SCHEMA_STATEMENTS:
+            cursor.execute(statement)
+        _ensure_search_schema(cursor)
+        backfilled = refresh_derived_fields(cursor)
+        if backfilled: print(f"Migrating database: computed display fields for {backfilled} articles.")
+        topics_assigned = assign_topics(cursor)
+        if topics_assigned: print(f"Migrating database: assigned topics to {topics_assigned} articles.")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def init_db():
+    """Brings an existing database file up to the current schema. Returns False if there is no database yet."""
+    if not os.path.exists(DB_PATH):
+        return False
+    conn = connect()
+    conn.close()
+    return True
+
+
+# --- Connection tuning ---
+# WAL lets the cron writer (content_creator.py) commit while web workers keep reading.
+# mmap and a larger page cache keep hot pages in memory; NORMAL sync is safe under WAL.
+BUSY_TIMEOUT_MS = 5000
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',      # ~16 MB of page cache per connection
+    'PRAGMA mmap_size = 268435456',    # 256 MB memory-mapped I/O
+    'PRAGMA temp_store = MEMORY',
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+)
+# sqlite3 keeps a per-connection cache of prepared statements, so reusing one
+# connection per thread also means the read queries are only compiled once.
+CACHED_STATEMENTS = 256
+
+
+def _apply_pragmas(conn):
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+
+
+def connect():
+    """Opens a read-write connection to the content database with the schema brought up to date.
+
+    Used by the writers (ingest jobs, backfills). Callers own the connection and must close it.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    _apply_pragmas(conn)
+    ensure_schema(conn)
+    return conn
+
+
+# --- Shared read connections ---
+# Each worker thread keeps one read-only connection and reuses it for every request.
+# Connections are never shared across threads, and a fork (gunicorn --preload) or a
+# call to reset_read_connections() makes every thread open a fresh one.
+_local = threading.local()
+_pool_lock = threading.Lock()
+_generation = 0
+_wal_enabled = False
+_pool_stats = {'opened': 0, 'reused': 0, 'closed': 0, 'open': 0}
+
+
+def _count(stat, delta=1):
+    with _pool_lock:
+        _pool_stats[stat] += delta
+
+
+def _ensure_wal():
+    """Switches the database file to WAL once per process (the setting is persistent)."""
+    global _wal_enabled
+    if _wal_enabled:
+        return
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        conn.execute('PRAGMA journal_mode = WAL')
+    finally:
+        conn.close()
+    _wal_enabled = True
+
+
+def _close_local_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+    _local.conn = None
+    if getattr(_local, 'pid', None) == os.getpid():
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _count('closed'); _count('open', -1)
+
+
+def get_read_connection():
+    """Returns this thread's reusable read-only connection, opening it on first use.
+
+    Do not close the returned connection. Raises sqlite3.OperationalError if the
+    database file doesn't exist yet (rather than silently creating an empty one).
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and (_local.pid != os.getpid() or _local.generation != _generation):
+        _close_local_connection()
+        conn = None
+    if conn is not None:
+        _count('reused')
+        return conn
+
+    if not os.path.exists(DB_PATH):
+        raise sqlite3.OperationalError(f"database not found at '{DB_PATH}'")
+    _ensure_wal()
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=CACHED_STATEMENTS)
+    conn.row_factory = sqlite3.Row
+    _apply_pragmas(conn)
+    conn.execute('PRAGMA query_only = ON')
+    _local.conn, _local.pid, _local.generation = conn, os.getpid(), _generation
+    _count('opened'); _count('open')
+    return conn
+
+
+def reset_read_connections():
+    """Makes every thread reopen its read connection, e.g. after the database file was replaced."""
+    global _generation, _wal_enabled
+    with _pool_lock:
+        _generation += 1
+        _wal_enabled = False
+    _close_local_connection()
+
+
+def pool_stats():
+    """Returns a snapshot of read-connection usage for this worker process."""
+    with _pool_lock:
+        stats = dict(_pool_stats)
+        stats['generation'] = _generation
+    stats['pid'] = os.getpid()
+    stats['wal_enabled'] = _wal_enabled
+    return stats
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from article_views import compute_trending
+from database import connect
+from related_articles import get_related_articles
+from images import MEDIA_DIR
+from product_catalog import DEALS_CSV_PATH, ProductCatalog
+from sitemap_writer import SITEMAP_DIR, write_sitemaps
+
+# --- Static Site Export ---
+# `python manage.py export-site --output DIR` renders every public page through the
+# Flask app into DIR (/ -> index.html, /article/1/slug -> article/1/slug/index.html,
+# ...) and copies static/, media/, the sitemaps and robots.txt next to them, so any
+# static file server can host the site. Pages are rendered by a pool of processes,
+# each with its own copy of the app.
+#
+# Each page's inputs are summarised in a signature (article revisions, its
+# neighbours and related articles, the products on it) stored in
+# DIR/.export-state.json. Later runs only re-render pages whose signature changed:
+# a new article re-renders itself, its neighbour, the articles that now list it as
+# related, the list pages (which all shift by one), its month and topic pages and
+# /archive; an edited deals.csv re-renders /deals and the products that changed.
+# Template or asset changes re-render everything. Pages that no longer exist are
+# deleted. The trending list is re-rendered on the homepage whenever it changes;
+# exported article pages leave it out rather than go stale.
+#
+# The search page and the storefront's filters and "load more" call the Flask app
+# (/search, /api/deals), so those paths still need to be proxied to it.
+
+STATE_FILE = '.export-state.json'
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+ARTICLES_PER_PAGE = 9  # Matches the homepage
+ARCHIVE_PER_PAGE = 12  # Matches the archive listings
+RELATED_LIMIT = 3      # Matches app.get_related_articles()
+RENDER_BATCH_SIZE = 50
+
+
+def _digest(value):
+    return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()[:16]
+
+
+def output_path(output_dir, url):
+    """'/' -> DIR/index.html, '/page/2' -> DIR/page/2/index.html, '/sitemap.xml' -> DIR/sitemap.xml"""
+    path = url.strip('/')
+    if not path:
+        return os.path.join(output_dir, 'index.html')
+    if os.path.splitext(path)[1]:
+        return os.path.join(output_dir, *path.split('/'))
+    return os.path.join(output_dir, *path.split('/'), 'index.html')
+
+
+# --- Page signatures ---
+def site_signature():
+    """Everything that changes every page: the templates and the asset manifest."""
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(TEMPLATES_DIR):
+        dirs.sort()
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as f:
+                h.update(name.encode('utf-8') + f.read())
+    try:
+        with open(os.path.join(STATIC_DIR, 'build', 'manifest.json'), 'rb') as f:
+            h.update(f.read())
+    except OSError:
+        pass
+    return h.hexdigest()[:16]
+
+
+def article_signatures(conn):
+    """{url: signature} for the homepage, every list and archive page and every article page."""
+    rows = conn.execute('SELECT id, slug, revision, timestamp, topic FROM articles ORDER BY timestamp DESC, id DESC').fetchall()
+    revisions = {row['id']: row['revision'] for row in rows}
+    pages = {}
+
+    # List pages: the cards on them and the pagination links.
+    total_pages = -(-len(rows) // ARTICLES_PER_PAGE)
+    for page in range(1, max(total_pages, 1) + 1):
+        cards = rows[(page - 1) * ARTICLES_PER_PAGE:page * ARTICLES_PER_PAGE]
+        url = '/' if page == 1 else f'/page/{page}'
+        pages[url] = _digest((total_pages, [(row['id'], row['revision']) for row in cards]))
+
+    # Archive pages: one listing per month and per topic, paginated like the list pages.
+    listings = {}
+    for row in rows:
+        year, month = row['timestamp'][:4], int(row['timestamp'][5:7])
+        listings.setdefault(f'/archive/{int(year)}/{month}', []).append(row)
+        if row['topic']:
+            listings.setdefault(f"/topic/{row['topic']}", []).append(row)
+    for base_url, listed in listings.items():
+        listing_pages = -(-len(listed) // ARCHIVE_PER_PAGE)
+        for page in range(1, listing_pages + 1):
+            cards = listed[(page - 1) * ARCHIVE_PER_PAGE:page * ARCHIVE_PER_PAGE]
+            url = base_url if page == 1 else f'{base_url}/page/{page}'
+            pages[url] = _digest((len(listed), [(row['id'], row['revision']) for row in cards]))
+    pages['/archive'] = _digest(sorted((url, len(listed)) for url, listed in listings.items()))
+
+    # Article pages: the row itself, the previous/next links (by id) and the related
+    # cards, looked up the way the page does, including any seeded random top-up.
+    ids = sorted(revisions)
+    slugs = {row['id']: row['slug'] for row in rows}
+    for i, article_id in enumerate(ids):
+        linked = [ids[i + 1] if i + 1 < len(ids) else None, ids[i - 1] if i > 0 else None]
+        linked += [card['id'] for card in get_related_articles(conn, article_id, RELATED_LIMIT)]
+        pages[f'/article/{article_id}/{slugs[article_id]}'] = _digest(
+            (revisions[article_id], [(other, revisions.get(other)) for other in linked]))
+    return pages
+
+
+def product_signatures(catalog):
+    """{url: signature} for /deals and every product page."""
+    products = catalog.all()
+    pages = {f'/deals/product/{product.slug}': _digest(sorted(product.to_dict().items())) for product in products}
+    pages['/deals'] = _digest(sorted(pages.items()))
+    return pages
+
+
+# --- Rendering (runs in the worker processes) ---
+_client = None
+
+
+def _init_worker():
+    global _client
+    # Rendering for export: no metrics, no view counting and no trending list on article pages.
+    # This module already imported metrics and article_views, so their switches are set directly.
+    import article_views
+    import metrics
+    metrics.ENABLED = False
+    article_views.ENABLED = False
+    article_views.ARTICLE_PAGE_TRENDING = False
+    os.environ.pop('RESPONSE_CACHE_DIR', None)
+    import app
+    _client = app.app.test_client()
+
+
+def _render_batch(output_dir, urls):
+    """Renders and writes a batch of pages. Returns the URLs that failed, with a reason."""
+    failed = []
+    for url in urls:
+        try:
+            response = _client.get(url)
+            if response.status_code != 200:
+                failed.append((url, f"HTTP {response.status_code}"))
+                continue
+            path = output_path(output_dir, url)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(response.get_data())
+            os.replace(tmp_path, path)
+        except Exception as e:
+            failed.append((url, str(e)))
+    return failed
+
+
+# --- Files copied as-is ---
+def _sync_tree(source_dir, dest_dir, skip_dirs=()):
+    """Copies new or changed files (by size and mtime) from source_dir. Returns how many."""
+    copied = 0
+    if not os.path.isdir(source_dir):
+        return copied
+    for root, dirs, files in os.walk(source_dir):
+        if root == source_dir:
+            dirs[:] = [d for d in dirs if d not in skip_dirs]
+        target_root = os.path.join(dest_dir, os.path.relpath(root, source_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            if name.startswith('.') or name.endswith('.tmp'):
+                continue
+            source, target = os.path.join(root, name), os.path.join(target_root, name)
+            stat = os.stat(source)
+            try:
+                existing = os.stat(target)
+                if existing.st_size == stat.st_size and int(existing.st_mtime) == int(stat.st_mtime):
+                    continue
+            except FileNotFoundError:
+                pass
+            shutil.copy2(source, target)
+            copied += 1
+    return copied
+
+
+def _copy_sitemaps(output_dir):
+    """Copies /sitemap.xml and, when sharded, /sitemaps/*.xml from SITEMAP_DIR."""
+    for name in os.listdir(SITEMAP_DIR):
+        if not name.endswith('.xml'):
+            continue
+        target = os.path.join(output_dir, 'sitemap.xml') if name == 'sitemap.xml' \
+            else os.path.join(output_dir, 'sitemaps', name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(os.path.join(SITEMAP_DIR, name), target)
+
+
+def _remove_page(output_dir, url):
+    path = output_path(output_dir, url)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    # Drop directories left empty (e.g. article/<id>/<old-slug>/).
+    directory = os.path.dirname(path)
+    while directory != output_dir:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def _read_state(output_dir):
+    try:
+        with open(os.path.join(output_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+# --- Export ---
+def export_site(output_dir, workers=None, full=False):
+    """Renders the site into `output_dir`, re-rendering only what changed since the last export.
+
+    Returns a summary dict: pages rendered, removed, failed and the time taken.
+    """
+    started = time.perf_counter()
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    conn = connect()
+    try:
+        catalog = ProductCatalog(DEALS_CSV_PATH)
+        pages = article_signatures(conn)
+        pages.update(product_signatures(catalog))
+        # Every homepage list page also shows the trending list (exported article pages don't).
+        trending = compute_trending(conn)[1]
+        for url in pages:
+            if url == '/' or url.startswith('/page/'):
+                pages[url] = _digest((pages[url], trending))
+        write_sitemaps(conn, catalog)
+    finally:
+        conn.close()
+
+    site = site_signature()
+    state = _read_state(output_dir)
+    previous = {} if full or not state or state.get('site') != site else state.get('pages', {})
+    stale = [url for url, signature in pages.items() if previous.get(url) != signature]
+    removed = [url for url in previous if url not in pages]
+    print(f"Static export: {len(pages)} pages, {len(stale)} to render, {len(removed)} to remove.")
+
+    failed = []
+    if stale:
+        workers = workers or os.cpu_count() or 1
+        batches = [stale[i:i + RENDER_BATCH_SIZE] for i in range(0, len(stale), RENDER_BATCH_SIZE)]
+        # 'spawn' gives every worker a fresh interpreter instead of a fork of this one's
+        # open database connection.
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches)), initializer=_init_worker,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            for batch_failures in executor.map(_render_batch, [output_dir] * len(batches), batches):
+                failed.extend(batch_failures)
+    for url, reason in failed[:20]:
+        print(f"   ... could not render {url}: {reason}")
+
+    for url in removed:
+        _remove_page(output_dir, url)
+    copied = _sync_tree(STATIC_DIR, os.path.join(output_dir, 'static'), skip_dirs={'sass'})
+    copied += _sync_tree(MEDIA_DIR, os.path.join(output_dir, 'media'))
+    shutil.copy2(os.path.join(STATIC_DIR, 'robots.txt'), os.path.join(output_dir, 'robots.txt'))
+    _copy_sitemaps(output_dir)
+
+    # Failed pages keep no signature, so the next run retries them.
+    failed_urls = {url for url, _ in failed}
+    rendered = {url: signature for url, signature in pages.items() if url not in failed_urls}
+    _write_state(output_dir, {'site': site, 'pages': rendered})
+
+    summary = {'pages': len(pages), 'rendered': len(stale) - len(failed), 'removed': len(removed),
+               'failed': len(failed), 'files_copied': copied, 'seconds': round(time.perf_counter() - started, 2)}
+    print(f"Static export complete: {summary}")
+    return summary
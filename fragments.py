@@ -0,0 +1,79 @@
+import os
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+import metrics
+from cache import LRUCache
+
+# --- Template Fragment Cache ---
+# `{% cache 'card', article.id, article.revision %}...{% endcache %}` renders its body
+# once per key and reuses the markup afterwards. Keys must include everything the
+# body depends on; for article markup that's the id plus `revision`, which a trigger
+# bumps on every UPDATE of the row (see database.py). Whole pages are already
+# response-cached, but every ingest invalidates them all, and this is what keeps the
+# re-render after an ingest down to the one new card.
+#
+# Compiled templates are also written to a bytecode cache on disk, so a fresh worker
+# loads them instead of re-parsing every template. `manage.py compile-templates`
+# fills it ahead of time. Jinja executes what it loads from there, so by default it
+# is Jinja's own per-user temp directory (created 0700, ownership checked);
+# TEMPLATE_BYTECODE_DIR must only point somewhere no other user can write.
+
+FRAGMENT_CACHE = LRUCache(maxsize=int(os.getenv('FRAGMENT_CACHE_SIZE', 4096)))
+BYTECODE_CACHE_DIR = os.getenv('TEMPLATE_BYTECODE_DIR')  # None: Jinja's per-user default
+
+FRAGMENT_LOOKUPS = metrics.Counter('template_fragment_cache_total', 'Template fragment cache lookups.', ('result',))
+metrics.EXPORTED.append(FRAGMENT_LOOKUPS)
+
+
+class FragmentCacheExtension(Extension):
+    """Adds the {% cache key, ... %}...{% endcache %} tag."""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        # The template name is part of the key, so two templates can reuse the same labels.
+        key.insert(0, nodes.Const(parser.name))
+        return nodes.CallBlock(self.call_method('_render_cached', [nodes.Tuple(key, 'load')]), [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key, caller):
+        markup = FRAGMENT_CACHE.get(key)
+        if markup is None:
+            FRAGMENT_LOOKUPS.inc('miss')
+            markup = caller()
+            FRAGMENT_CACHE.set(key, markup)
+        else:
+            FRAGMENT_LOOKUPS.inc('hit')
+        return markup
+
+
+def make_bytecode_cache():
+    try:
+        if BYTECODE_CACHE_DIR is None:
+            return FileSystemBytecodeCache()
+        os.makedirs(BYTECODE_CACHE_DIR, mode=0o700, exist_ok=True)
+        return FileSystemBytecodeCache(BYTECODE_CACHE_DIR)
+    except (OSError, RuntimeError) as e:
+        print(f"Template bytecode cache disabled (no private cache directory): {e}")
+        return None
+
+
+def compile_templates(app):
+    """Loads every template once, which writes its bytecode to the cache. Returns the count."""
+    env = app.jinja_env
+    names = [name for name in env.list_templates() if name.endswith(('.html', '.xml', '.txt'))]
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def init_app(app):
+    """Installs the {% cache %} tag and the on-disk bytecode cache."""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.bytecode_cache = make_bytecode_cache()
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from urllib3.exceptions import HTTPError as Urllib3Error, ReadTimeoutError
+
+import metrics
+
+# --- Outbound HTTP ---
+# Every call to an external API goes through here:
+#   - one keep-alive session per process, with a pool big enough for the journalist's workers;
+#   - a deadline per call, shared by all its attempts. It bounds connecting, waiting
+#     for the response and reading it (checked between body chunks), so a server that
+#     trickles bytes is cut off too; a call can only overrun it by one stalled socket
+#     read, itself bounded by the time that was left;
+#   - up to MAX_ATTEMPTS tries on network errors, 429 and 5xx, with exponential backoff
+#     and full jitter (and Retry-After honoured when the server sends it);
+#   - a circuit breaker per host: after BREAKER_FAILURES failed calls in a row, calls
+#     fail at once for BREAKER_RESET_SECONDS, then one trial call decides;
+#   - chat_completion() answers are cached on disk by a hash of the prompt, so asking
+#     the same thing twice (e.g. re-running a failed ingest) is never billed twice.
+#     Answers expire after PROMPT_CACHE_TTL_DAYS; each journalist run prunes them.
+# PPLX_API_URL can point at a local stub server for testing.
+
+PPLX_API_URL = os.getenv('PPLX_API_URL', 'https://api.perplexity.ai/chat/completions')
+PPLX_MODEL = 'sonar'
+POOL_SIZE = 8
+CONNECT_TIMEOUT = 10
+DEFAULT_DEADLINE = 120         # seconds for a whole call, retries included
+MAX_ATTEMPTS = 3
+BACKOFF_SECONDS = 2            # Upper bound of the first retry's delay, doubled each time
+MAX_BACKOFF_SECONDS = 30
+BODY_CHUNK_SIZE = 16 * 1024
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+BREAKER_FAILURES = 5
+BREAKER_RESET_SECONDS = 60
+PROMPT_CACHE_DIR = os.getenv('PROMPT_CACHE_DIR', os.path.join(os.getenv('RENDER_DISK_PATH', '.'), 'prompt_cache'))
+PROMPT_CACHE_ENABLED = os.getenv('PROMPT_CACHE', '1') != '0'
+PROMPT_CACHE_TTL_DAYS = float(os.getenv('PROMPT_CACHE_TTL_DAYS', 14))
+
+OUTBOUND_CALLS = metrics.Counter('http_client_calls_total', 'Outbound API calls by host and outcome.', ('host', 'result'))
+metrics.EXPORTED.append(OUTBOUND_CALLS)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without making a request while a host's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Fails fast after repeated failures, then lets a single trial call through after a cool-down."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Raises UpstreamUnavailable if the call shouldn't be made. Returns True for a half-open trial call."""
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            if time.monotonic() - self.opened_at < self.reset_seconds or self.trial_running:
+                raise UpstreamUnavailable(f"circuit open after {self.failures} consecutive failures")
+            self.trial_running = True  # Half-open: this call decides
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+    def end_trial(self):
+        """Called when a trial call ends however it ended, so an unexpected exception can't wedge the breaker open."""
+        with self.lock:
+            self.trial_running = False
+
+
+_session = None
+_session_lock = threading.Lock()
+_breakers = {}
+
+
+def get_session():
+    """The process-wide keep-alive session (recreated after a fork)."""
+    global _session
+    with _session_lock:
+        if _session is None or _session.pid != os.getpid():
+            _session = requests.Session()
+            _session.pid = os.getpid()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+
+def get_breaker(url):
+    host = urlsplit(url).netloc
+    with _session_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+def _retry_delay(attempt, response=None):
+    if response is not None and response.headers.get('Retry-After', '').isdigit():
+        return min(float(response.headers['Retry-After']), MAX_BACKOFF_SECONDS)
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** (attempt - 1)))
+
+
+def _read_body(response, give_up_at, deadline):
+    """Reads a streamed response body into `response.content`, giving up at the deadline."""
+    raw = response.raw
+    # read1() returns whatever one socket read produced; plain read() waits for a full chunk.
+    read = getattr(raw, 'read1', None) or raw.read
+    chunks = []
+    try:
+        while True:
+            if time.monotonic() >= give_up_at:
+                raise requests.Timeout(f"deadline of {deadline}s exceeded while reading the response")
+            chunk = read(BODY_CHUNK_SIZE, decode_content=True)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    except ReadTimeoutError as e:
+        raise requests.Timeout(e)
+    except Urllib3Error as e:
+        raise requests.ConnectionError(e)
+    response._content = b''.join(chunks)
+    response._content_consumed = True
+    response.close()  # Returns the connection to the pool
+
+
+def request(method, url, deadline=DEFAULT_DEADLINE, **kwargs):
+    """Sends a request with the deadline, retry and circuit-breaker policy above. Returns the response.
+
+    Raises UpstreamUnavailable, requests.Timeout/ConnectionError, or requests.HTTPError for
+    error statuses (after the retries, for retryable ones).
+    """
+    host = urlsplit(url).netloc
+    breaker = get_breaker(url)
+    trial = breaker.before_call()
+    try:
+        give_up_at = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = give_up_at - time.monotonic()
+            response = None
+            try:
+                if remaining <= 0:
+                    raise requests.Timeout(f"deadline of {deadline}s exceeded")
+                with metrics.timed('http'):
+                    response = get_session().request(method, url, timeout=(min(CONNECT_TIMEOUT, remaining), remaining),
+                                                     stream=True, **kwargs)
+                    _read_body(response, give_up_at, deadline)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if response is not None:
+                    response.close()
+                    response = None
+                error = e
+            except requests.RequestException:
+                breaker.record_failure()
+                OUTBOUND_CALLS.inc(host, 'error')
+                raise
+            if response is not None:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    # Anything else means the upstream is up, even a 4xx for a bad request.
+                    breaker.record_success()
+                    OUTBOUND_CALLS.inc(host, 'ok' if response.ok else 'client_error')
+                    response.raise_for_status()
+                    return response
+                error = requests.HTTPError(f"{response.status_code} from {url}", response=response)
+            delay = _retry_delay(attempt, response)
+            if attempt >= MAX_ATTEMPTS or time.monotonic() + delay >= give_up_at:
+                breaker.record_failure()
+                OUTBOUND_CALLS.inc(host, 'error')
+                raise error
+            print(f"   ... request to {host} failed ({error}); retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_ATTEMPTS})")
+            time.sleep(delay)
+    finally:
+        if trial:
+            breaker.end_trial()
+
+
+def get(url, deadline=DEFAULT_DEADLINE, **kwargs):
+    return request('GET', url, deadline=deadline, **kwargs)
+
+
+def post_json(url, payload, headers=None, deadline=DEFAULT_DEADLINE):
+    headers = dict(headers or {}, accept='application/json')
+    headers['content-type'] = 'application/json'
+    return request('POST', url, deadline=deadline, headers=headers, data=json.dumps(payload))
+
+
+# --- Prompt cache ---
+def prompt_key(url, payload):
+    return hashlib.sha256(json.dumps([url, payload], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(PROMPT_CACHE_DIR, key[:2], f"{key}.json")
+
+
+def cached_answer(key):
+    try:
+        with open(_cache_path(key)) as f:
+            entry = json.load(f)
+        if time.time() - entry['created_at'] > PROMPT_CACHE_TTL_DAYS * 86400:
+            return None
+        return entry['content']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def store_answer(key, content):
+    path = _cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'content': content, 'created_at': time.time()}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Prompt cache: could not store an answer: {e}")
+
+
+def prune_prompt_cache():
+    """Deletes cached answers older than the TTL (by file age). Returns how many were removed."""
+    cutoff = time.time() - PROMPT_CACHE_TTL_DAYS * 86400
+    removed = 0
+    if not os.path.isdir(PROMPT_CACHE_DIR):
+        return removed
+    for root, _, files in os.walk(PROMPT_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass  # Already gone (another worker pruned it)
+    return removed
+
+
+def chat_completion(system_prompt, user_prompt, parse=None, deadline=DEFAULT_DEADLINE, model=PPLX_MODEL):
+    """Asks Perplexity and returns the answer text, or `parse(text)` if given.
+
+    Answers are cached by prompt; one that `parse` rejects is not cached, so a
+    malformed answer is asked for again next time.
+    """
+    api_key = os.getenv('PPLX_API_KEY')
+    if not api_key: raise Exception("PPLX_API_KEY not set.")
+    payload = {'model': model, 'messages': [{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': user_prompt}]}
+    key = prompt_key(PPLX_API_URL, payload)
+    content = cached_answer(key) if PROMPT_CACHE_ENABLED else None
+    if content is not None:
+        OUTBOUND_CALLS.inc(urlsplit(PPLX_API_URL).netloc, 'cache_hit')
+        try:
+            return parse(content) if parse else content
+        except Exception:
+            pass  # An answer cached before `parse` got stricter: ask again.
+    response = post_json(PPLX_API_URL, payload, headers={'authorization': f"Bearer {api_key}"}, deadline=deadline)
+    content = response.json()['choices'][0]['message']['content']
+    result = parse(content) if parse else content
+    if PROMPT_CACHE_ENABLED:
+        store_answer(key, content)
+    return result
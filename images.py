@@ -0,0 +1,182 @@
+import hashlib
+import io
+import json
+import os
+
+from flask import send_from_directory, url_for
+
+# --- Responsive Images ---
+# Local images under static/ get width-bucketed derivatives at build time (via
+# `manage.py build-assets`), listed under 'images' in the asset manifest. Article
+# images are downloaded once at ingest and stored as card thumbnails under
+# MEDIA_DIR, served from /media/ with long-lived caching. Templates use
+# static_image()/static_srcset() and article_image() to emit src + srcset.
+# An image narrower than the largest width also gets a copy at its own width,
+# and an article image that can't be fetched or resized is recorded as having no
+# thumbnails ('{}'), so backfills don't retry it.
+# Pillow is optional: without it no derivatives are made and originals are used.
+# It is imported on first use, since serving pages never needs it.
+
+STATIC_WIDTHS = (480, 960, 1440, 1920)
+THUMBNAIL_WIDTHS = (400, 800)
+DERIVATIVE_FORMAT = os.getenv('IMAGE_DERIVATIVE_FORMAT', 'webp').lower()  # webp, avif or jpeg
+QUALITY = {'webp': 80, 'avif': 60, 'jpeg': 82}
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+MEDIA_DIR = os.path.join(os.getenv('RENDER_DISK_PATH', '.'), 'media')
+MAX_DOWNLOAD_BYTES = 15 * 1024 * 1024
+DOWNLOAD_TIMEOUT = (5, 20)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+_pil = None
+
+
+def load_pil():
+    """Imports Pillow on first use. Returns its Image module, or None if it isn't installed."""
+    global _pil
+    if _pil is None:
+        try:
+            from PIL import Image
+            _pil = Image
+        except ImportError:
+            _pil = False
+    return _pil or None
+
+
+def output_format():
+    """The configured derivative format, or JPEG if this Pillow build can't write it."""
+    if load_pil() is None:
+        return None
+    from PIL import features
+    if DERIVATIVE_FORMAT in ('webp', 'avif') and features.check(DERIVATIVE_FORMAT):
+        return DERIVATIVE_FORMAT
+    return 'jpeg'
+
+
+def resize_variants(data, widths):
+    """Yields (width, bytes, extension) for each width not larger than the source image,
+    then the source's own width if it is narrower than the largest one."""
+    fmt = output_format()
+    if fmt is None:
+        return
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA') or (fmt == 'jpeg' and image.mode == 'RGBA'):
+            image = image.convert('RGB')
+        source_width = image.width
+        largest = min(source_width, max(widths))
+        for width in [width for width in widths if width < largest] + [largest]:
+            height = max(1, round(image.height * width / source_width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            resized.save(out, format=fmt.upper(), quality=QUALITY[fmt], optimize=fmt == 'jpeg')
+            yield width, out.getvalue(), 'jpg' if fmt == 'jpeg' else fmt
+
+
+# --- Build time: static images ---
+def build_static_derivatives(static_dir, sources, build_dir_name):
+    """Writes derivatives for local images. Returns {logical: [[width, built name], ...]}."""
+    derivatives = {}
+    if load_pil() is None:
+        print("Pillow is not installed; skipping responsive image derivatives.")
+        return derivatives
+    for logical in sources:
+        if not logical.lower().endswith(SOURCE_EXTENSIONS):
+            continue
+        with open(os.path.join(static_dir, logical), 'rb') as f:
+            data = f.read()
+        try:
+            variants = list(resize_variants(data, STATIC_WIDTHS))
+        except Exception as e:
+            print(f"Could not resize '{logical}': {e}")
+            continue
+        stem = os.path.splitext(logical)[0]
+        for width, body, ext in variants:
+            name = f"{build_dir_name}/{stem}.{width}w.{hashlib.sha256(body).hexdigest()[:12]}.{ext}"
+            path = os.path.join(static_dir, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(body)
+            derivatives.setdefault(logical, []).append([width, name])
+    return derivatives
+
+
+# --- Ingest time: article thumbnails ---
+def _download(session, url):
+    with session.get(url, timeout=DOWNLOAD_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        data = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            data += chunk
+            if len(data) > MAX_DOWNLOAD_BYTES:
+                raise ValueError("image is too large")
+        return bytes(data)
+
+
+def create_article_thumbnails(session, article_id, image_url):
+    """Downloads an article's image and stores card-sized copies.
+
+    Returns {width: filename}, {} if the image can't be used, or None without Pillow.
+    """
+    if load_pil() is None:
+        return None
+    if not image_url:
+        return {}
+    try:
+        data = _download(session, image_url)
+        os.makedirs(MEDIA_DIR, exist_ok=True)
+        thumbnails = {}
+        for width, body, ext in resize_variants(data, THUMBNAIL_WIDTHS):
+            filename = f"article-{article_id}-{width}w.{hashlib.sha256(body).hexdigest()[:12]}.{ext}"
+            tmp_path = os.path.join(MEDIA_DIR, f"{filename}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, os.path.join(MEDIA_DIR, filename))
+            thumbnails[str(width)] = filename
+        return thumbnails
+    except Exception as e:
+        print(f"Could not create thumbnails for article {article_id}: {e}")
+        return {}
+
+
+# --- Templates ---
+def init_app(app, manifest):
+    """Registers /media/<filename> and the srcset template helpers."""
+    derivatives = (manifest or {}).get('images', {})
+
+    @app.route('/media/<path:filename>')
+    def media(filename):
+        """Serves a stored thumbnail. Names include a content hash, so they never change."""
+        response = send_from_directory(MEDIA_DIR, filename)
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        return response
+
+    def static_srcset(filename):
+        """'url 480w, url 960w, ...' for a local image, or '' if it has no derivatives."""
+        return ', '.join(f"{url_for('static', filename=name)} {width}w" for width, name in derivatives.get(filename, []))
+
+    def static_image(filename, width=None):
+        """The URL of the smallest derivative at least `width` wide (or the largest one), else the original."""
+        variants = derivatives.get(filename)
+        if not variants:
+            return url_for('static', filename=filename)
+        chosen = next((name for w, name in variants if width and w >= width), variants[-1][1])
+        return url_for('static', filename=chosen)
+
+    def article_image(article, fallback='images/pic02.jpg'):
+        """{'src', 'srcset'} for an article card: stored thumbnails, else the remote original, else `fallback`."""
+        # Cards are sqlite3.Row objects or dicts; older queries may not select the column.
+        stored = article['thumbnails'] if 'thumbnails' in article.keys() else None
+        thumbnails = json.loads(stored) if stored else {}
+        if thumbnails:
+            ordered = sorted(thumbnails.items(), key=lambda item: int(item[0]))
+            return {'src': url_for('media', filename=ordered[-1][1]),
+                    'srcset': ', '.join(f"{url_for('media', filename=name)} {width}w" for width, name in ordered)}
+        if article['image_url']:
+            return {'src': article['image_url'], 'srcset': ''}
+        return {'src': static_image(fallback, THUMBNAIL_WIDTHS[-1]), 'srcset': static_srcset(fallback)}
+
+    @app.context_processor
+    def image_helpers():
+        return dict(static_srcset=static_srcset, static_image=static_image, article_image=article_image)
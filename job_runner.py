@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import database
+from cache import LRUCache
+
+# --- Background Job Runner ---
+# The cron routes hand their work to this runner and return immediately with a job id.
+# Every run is recorded in the `job_runs` table, which also de-duplicates triggers:
+# while a job of the same name is queued or running (in any worker process), a new
+# trigger just gets the existing job's id back.
+
+JOB_RUNS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS job_runs (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        status TEXT NOT NULL,
+        queued_at TEXT NOT NULL,
+        started_at TEXT,
+        finished_at TEXT,
+        duration_seconds REAL,
+        result TEXT,
+        error TEXT,
+        pid INTEGER
+    )
+'''
+JOB_RUNS_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_job_runs_name_status ON job_runs (name, status)'
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class JobRunner:
+    """Runs named jobs on a small thread pool and records their history in SQLite.
+
+    A queued/running record older than `stale_after` seconds is assumed to belong
+    to a worker that died and no longer blocks new runs of that job.
+    """
+
+    def __init__(self, max_workers=2, stale_after=3600):
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job-runner')
+        self._lock = threading.Lock()
+        self._active = {}   # job name -> job id, for jobs owned by this process
+        self._jobs = LRUCache(maxsize=200)  # job id -> record, a fallback when the database isn't available
+
+    # --- Persistence ---
+    def _connect(self):
+        """Opens the job history database, or returns None if the content DB doesn't exist yet."""
+        if not os.path.exists(database.DB_PATH):
+            return None
+        conn = sqlite3.connect(database.DB_PATH, timeout=database.BUSY_TIMEOUT_MS / 1000)
+        conn.row_factory = sqlite3.Row
+        conn.execute(JOB_RUNS_TABLE_SQL)
+        conn.execute(JOB_RUNS_INDEX_SQL)
+        return conn
+
+    def _update(self, job_id, **fields):
+        record = self._jobs.get(job_id)
+        if record is not None:
+            record.update(fields)
+        try:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                assignments = ', '.join(f'{column} = ?' for column in fields)
+                conn.execute(f'UPDATE job_runs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Job runner: could not record job {job_id}: {e}")
+
+    def _claim(self, name, record):
+        """Inserts a queued record unless the same job is already active. Returns the id to report."""
+        conn = self._connect()
+        if conn is None:
+            return record['id']
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            cutoff = datetime.fromtimestamp(time.time() - self.stale_after, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            row = conn.execute(
+                f"SELECT id FROM job_runs WHERE name = ? AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))}) "
+                "AND queued_at >= ? ORDER BY queued_at DESC LIMIT 1",
+                (name, *ACTIVE_STATUSES, cutoff)
+            ).fetchone()
+            if row is not None:
+                conn.rollback()
+                return row['id']
+            conn.execute(
+                'INSERT INTO job_runs (id, name, status, queued_at, pid) VALUES (?, ?, ?, ?, ?)',
+                (record['id'], name, 'queued', record['queued_at'], os.getpid())
+            )
+            conn.commit()
+            return record['id']
+        finally:
+            conn.close()
+
+    # --- Running jobs ---
+    def submit(self, name, func):
+        """Queues `func` as job `name`. Returns (job_id, created) where created is False for a duplicate trigger."""
+        with self._lock:
+            if name in self._active:
+                return self._active[name], False
+            record = {'id': uuid.uuid4().hex, 'name': name, 'status': 'queued', 'queued_at': _now(),
+                      'started_at': None, 'finished_at': None, 'duration_seconds': None,
+                      'result': None, 'error': None}
+            try:
+                job_id = self._claim(name, record)
+            except sqlite3.Error as e:
+                print(f"Job runner: could not check job history, running anyway: {e}")
+                job_id = record['id']
+            if job_id != record['id']:
+                return job_id, False
+            self._active[name] = job_id
+            self._jobs.set(job_id, record)
+        self._executor.submit(self._run, name, job_id, func)
+        return job_id, True
+
+    def _run(self, name, job_id, func):
+        started = time.perf_counter()
+        self._update(job_id, status='running', started_at=_now())
+        print(f"--- Job '{name}' ({job_id}) started ---")
+        try:
+            result = func()
+            self._update(job_id, status='succeeded', finished_at=_now(),
+                         duration_seconds=round(time.perf_counter() - started, 3),
+                         result=None if result is None else str(result))
+            print(f"--- Job '{name}' ({job_id}) finished ---")
+        except Exception as e:
+            self._update(job_id, status='failed', finished_at=_now(),
+                         duration_seconds=round(time.perf_counter() - started, 3),
+                         error=f"{e}\n{traceback.format_exc(limit=5)}")
+            print(f"!!! Job '{name}' ({job_id}) failed: {e} !!!")
+        finally:
+            with self._lock:
+                if self._active.get(name) == job_id:
+                    del self._active[name]
+
+    def get(self, job_id):
+        """Returns a job's record as a dict, or None if the id is unknown."""
+        try:
+            conn = self._connect()
+            if conn is not None:
+                try:
+                    row = conn.execute('SELECT * FROM job_runs WHERE id = ?', (job_id,)).fetchone()
+                finally:
+                    conn.close()
+                if row is not None:
+                    return dict(row)
+        except sqlite3.Error as e:
+            print(f"Job runner: could not read job {job_id}: {e}")
+        record = self._jobs.get(job_id)
+        return dict(record) if record else None
+
+    def history(self, name=None, limit=20):
+        """The most recent runs, newest first (optionally for one job name)."""
+        try:
+            conn = self._connect()
+            if conn is None:
+                return []
+            try:
+                if name:
+                    rows = conn.execute('SELECT * FROM job_runs WHERE name = ? ORDER BY queued_at DESC LIMIT ?', (name, limit))
+                else:
+                    rows = conn.execute('SELECT * FROM job_runs ORDER BY queued_at DESC LIMIT ?', (limit,))
+                return [dict(row) for row in rows]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Job runner: could not read the job history: {e}")
+            return []
@@ -0,0 +1,149 @@
+"""Maintenance commands for the Lazy Lion site.
+
+Usage:
+    python manage.py backfill-keywords [--limit N]
+    python manage.py backfill-thumbnails [--limit N]
+    python manage.py rebuild-related
+    python manage.py rebuild-search
+    python manage.py reassign-topics
+    python manage.py build-sitemaps
+    python manage.py build-assets
+    python manage.py compile-templates
+    python manage.py startup-report [--path /]
+    python manage.py export-site --output DIR [--workers N] [--full]
+"""
+import argparse
+
+
+def cmd_backfill_keywords(args):
+    from content_creator import backfill_seo_keywords
+    backfill_seo_keywords(limit=args.limit)
+
+
+def cmd_backfill_thumbnails(args):
+    from content_creator import backfill_thumbnails
+    backfill_thumbnails(limit=args.limit)
+
+
+def cmd_rebuild_related(args):
+    from database import connect
+    from related_articles import rebuild_related_articles
+    conn = connect()
+    try:
+        rebuild_related_articles(conn)
+    finally:
+        conn.close()
+
+
+def cmd_rebuild_search(args):
+    from database import connect, rebuild_search_index
+    conn = connect()
+    try:
+        print("Rebuilding the full-text search index...")
+        rebuild_search_index(conn)
+        print("Search index rebuilt.")
+    finally:
+        conn.close()
+
+
+def cmd_reassign_topics(args):
+    from database import assign_topics, connect
+    conn = connect()
+    try:
+        changed = assign_topics(conn.cursor(), only_missing=False)
+        conn.commit()
+        print(f"Topics reassigned: {changed} articles changed topic.")
+    finally:
+        conn.close()
+
+
+def cmd_build_sitemaps(args):
+    from database import connect
+    from product_catalog import DEALS_CSV_PATH, ProductCatalog
+    from sitemap_writer import write_sitemaps
+    conn = connect()
+    try:
+        write_sitemaps(conn, ProductCatalog(DEALS_CSV_PATH), full=True)
+        print("Sitemaps written.")
+    finally:
+        conn.close()
+
+
+def cmd_build_assets(args):
+    from assets import build_assets
+    build_assets()
+
+
+def cmd_compile_templates(args):
+    from app import app
+    from fragments import compile_templates
+    if app.jinja_env.bytecode_cache is None:
+        print("The template bytecode cache is disabled; nothing to compile.")
+        return
+    count = compile_templates(app)
+    print(f"Compiled {count} templates into '{app.jinja_env.bytecode_cache.directory}'.")
+
+
+def cmd_startup_report(args):
+    from startup import startup_report
+    report = startup_report(path=args.path)
+    print(f"App import: {report['import_seconds'] * 1000:.0f} ms, "
+          f"first request ({args.path} -> {report['first_request_status']}): {report['first_request_seconds'] * 1000:.0f} ms")
+    print("Slowest imports made by app.py:")
+    for item in report['slowest_imports']:
+        print(f"  {item['ms']:>8.1f} ms  {item['module']}")
+    if report['heavy_modules_loaded']:
+        print(f"Warning: heavy modules imported on the serving path: {', '.join(report['heavy_modules_loaded'])}")
+
+
+def cmd_export_site(args):
+    from export import export_site
+    export_site(args.output, workers=args.workers, full=args.full)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lazy Lion maintenance commands.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backfill = subparsers.add_parser('backfill-keywords', help="Generate SEO keywords for articles that have none.")
+    backfill.add_argument('--limit', type=int, default=None, help="Only process this many articles (newest first).")
+    backfill.set_defaults(func=cmd_backfill_keywords)
+
+    thumbnails = subparsers.add_parser('backfill-thumbnails', help="Download and resize card images for articles that have none.")
+    thumbnails.add_argument('--limit', type=int, default=None, help="Only process this many articles (newest first).")
+    thumbnails.set_defaults(func=cmd_backfill_thumbnails)
+
+    related = subparsers.add_parser('rebuild-related', help="Recompute every article's related-articles list.")
+    related.set_defaults(func=cmd_rebuild_related)
+
+    search = subparsers.add_parser('rebuild-search', help="Rebuild the full-text search index from the articles table.")
+    search.set_defaults(func=cmd_rebuild_search)
+
+    topics = subparsers.add_parser('reassign-topics', help="Re-run topic assignment for every article (after editing topics.py).")
+    topics.set_defaults(func=cmd_reassign_topics)
+
+    sitemaps = subparsers.add_parser('build-sitemaps', help="Regenerate every sitemap file from scratch.")
+    sitemaps.set_defaults(func=cmd_build_sitemaps)
+
+    static_assets = subparsers.add_parser('build-assets', help="Fingerprint, bundle and precompress static/ into static/build/.")
+    static_assets.set_defaults(func=cmd_build_assets)
+
+    templates = subparsers.add_parser('compile-templates', help="Pre-compile every template into the bytecode cache.")
+    templates.set_defaults(func=cmd_compile_templates)
+
+    report = subparsers.add_parser('startup-report', help="Time app.py's imports and first request in a fresh interpreter.")
+    report.add_argument('--path', default='/', help="The URL to request first.")
+    report.set_defaults(func=cmd_startup_report)
+
+    export = subparsers.add_parser('export-site', help="Pre-render the whole site to a directory for a static file server.")
+    export.add_argument('--output', required=True, help="Where to write the site.")
+    export.add_argument('--workers', type=int, default=None, help="Rendering processes (default: one per CPU).")
+    export.add_argument('--full', action='store_true', help="Re-render every page, not just the ones that changed.")
+    export.set_defaults(func=cmd_export_site)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import bisect
+import functools
+import os
+import threading
+import time
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+
+# --- Request Metrics ---
+# Times every request and the phases inside it (db, render, http, file) and exposes
+# them as Prometheus histograms on /metrics and as a Server-Timing header on each
+# response. Each gunicorn worker keeps its own numbers, so scrape every worker (or
+# sum them in Prometheus). Set METRICS_ENABLED=0 to turn all of it into no-ops.
+
+ENABLED = os.getenv('METRICS_ENABLED', '1') != '0'
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """A thread-safe Prometheus histogram with a fixed set of label names."""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return '\n'.join(lines)
+
+
+class Counter:
+    """A thread-safe Prometheus counter with a fixed set of label names."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            lines.append(f'{self.name}{{{label_text}}} {value}')
+        return '\n'.join(lines)
+
+
+class Gauge:
+    """A single unlabelled value that can go up and down."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if self.value is not None:
+            lines.append(f'{self.name} {self.value}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Time spent handling a request.',
+                             ('route', 'method', 'status'))
+PHASE_DURATION = Histogram('phase_duration_seconds', 'Time spent in one phase (db, render, http, file) of a request or job.',
+                           ('phase', 'route'))
+TEMPLATE_RENDER_DURATION = Histogram('template_render_duration_seconds', 'Time spent rendering one template.',
+                                     ('template',))
+
+
+def _route():
+    if not has_request_context():
+        return 'background'
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+# --- Phase timers ---
+class _PhaseTimer:
+    """Context manager that records one phase. A phase nested inside the same phase
+    (e.g. a DB helper calling another DB helper) is only counted once."""
+
+    __slots__ = ('phase', 'start', 'outermost')
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.outermost = True
+        if has_request_context():
+            active = g.setdefault('_metrics_active', set())
+            if self.phase in active:
+                self.outermost = False
+                return self
+            active.add(self.phase)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.outermost:
+            return False
+        elapsed = time.perf_counter() - self.start
+        if has_request_context():
+            g._metrics_active.discard(self.phase)
+            phases = g.setdefault('_metrics_phases', {})
+            phases[self.phase] = phases.get(self.phase, 0.0) + elapsed
+        PHASE_DURATION.observe(elapsed, self.phase, _route())
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(phase):
+    """`with metrics.timed('db'): ...` records how long the block took."""
+    return _PhaseTimer(phase) if ENABLED else _NULL_TIMER
+
+
+def timed_function(phase):
+    """Decorator form of timed(). Returns the function untouched when metrics are disabled."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _PhaseTimer(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Flask integration ---
+def _start_request():
+    g._metrics_start = time.perf_counter()
+
+
+def _finish_request(response):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    REQUEST_DURATION.observe(elapsed, _route(), request.method, str(response.status_code))
+    timings = [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in g.get('_metrics_phases', {}).items()]
+    timings.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+
+def _start_render(sender, template, context, **extra):
+    # A stack, so a template rendered while another one is rendering is timed on its own.
+    g.setdefault('_metrics_render_timers', []).append((_PhaseTimer('render').__enter__(), time.perf_counter()))
+
+
+def _finish_render(sender, template, context, **extra):
+    timers = g.get('_metrics_render_timers')
+    if timers:
+        timer, start = timers.pop()
+        timer.__exit__(None, None, None)
+        TEMPLATE_RENDER_DURATION.observe(time.perf_counter() - start, template.name or 'string')
+
+
+# Other modules append their own metrics here (e.g. fragments.py's cache counters).
+EXPORTED = [REQUEST_DURATION, PHASE_DURATION, TEMPLATE_RENDER_DURATION]
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    return '\n'.join(metric.render() for metric in EXPORTED) + '\n'
+
+
+def init_app(app):
+    """Installs the request hooks, template timing and the /metrics endpoint."""
+    if not ENABLED:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_finish_render, app)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,216 @@
+import bisect
+import csv
+import os
+import re
+import threading
+import time
+
+import metrics
+
+# deals.csv lives next to the code, regardless of the working directory.
+DEALS_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deals.csv')
+
+PRODUCT_FIELDS = ('slug', 'title', 'price', 'image_url', 'affiliate_link', 'category',
+                  'keywords', 'pros', 'cons', 'description')
+
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def parse_price(price):
+    """Parses an Indian-formatted price string like '9,999' or '18,499.00' into whole rupees."""
+    try:
+        return int(float(re.sub(r'[^\d.]', '', price or '')))
+    except ValueError:
+        return None
+
+
+def _preview_list(text, limit=2):
+    return [item.strip() for item in (text or '').split(',') if item.strip()][:limit]
+
+
+def category_key(category):
+    """Turns a display category like 'Home Appliances' into the 'home-appliances' key the filters use."""
+    return re.sub(r'\s+', '-', (category or '').strip().lower())
+
+
+class Product:
+    """One row of deals.csv. Slotted so a large catalog stays compact in every worker."""
+    __slots__ = PRODUCT_FIELDS + ('category_key', 'price_value')
+
+    def __init__(self, row):
+        for field in PRODUCT_FIELDS:
+            setattr(self, field, (row.get(field) or '').strip())
+        self.category_key = category_key(self.category)
+        self.price_value = parse_price(self.price)
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in PRODUCT_FIELDS}
+
+    def to_card(self):
+        """The lightweight fields a storefront card needs (no description, only two pros/cons)."""
+        return {
+            'slug': self.slug,
+            'title': self.title,
+            'price': self.price,
+            'image_url': self.image_url,
+            'affiliate_link': self.affiliate_link,
+            'category': self.category,
+            'pros': _preview_list(self.pros),
+            'cons': _preview_list(self.cons),
+        }
+
+    def search_tokens(self):
+        return set(TOKEN_RE.findall(f"{self.title} {self.keywords}".lower()))
+
+
+class _Snapshot:
+    """An immutable, fully indexed view of the catalog. Reloads swap in a whole new one."""
+    __slots__ = ('products', 'by_slug', 'by_category', 'cards', 'token_index', 'sorted_tokens',
+                 'category_positions', 'orders', 'signature', 'loaded_at')
+
+    def __init__(self, products, signature):
+        self.products = tuple(products)
+        self.by_slug = {}
+        by_category = {}
+        category_positions = {}
+        token_index = {}
+        for position, product in enumerate(self.products):
+            self.by_slug.setdefault(product.slug, product)
+            by_category.setdefault(product.category_key, []).append(product)
+            category_positions.setdefault(product.category_key, set()).add(position)
+            for token in product.search_tokens():
+                token_index.setdefault(token, set()).add(position)
+        self.by_category = {key: tuple(items) for key, items in by_category.items()}
+        self.category_positions = {key: frozenset(items) for key, items in category_positions.items()}
+        self.token_index = {token: frozenset(items) for token, items in token_index.items()}
+        # Sorted, so the tokens starting with a prefix are one contiguous range found by bisection.
+        self.sorted_tokens = tuple(sorted(self.token_index))
+        self.cards = tuple(product.to_card() for product in self.products)
+
+        # Pre-sorted position lists for each sort order; unpriced products always go last.
+        positions = range(len(self.products))
+        priced = [p for p in positions if self.products[p].price_value is not None]
+        unpriced = [p for p in positions if self.products[p].price_value is None]
+        by_price = sorted(priced, key=lambda p: self.products[p].price_value)
+        self.orders = {
+            'default': tuple(positions),
+            'price_asc': tuple(by_price + unpriced),
+            'price_desc': tuple(by_price[::-1] + unpriced),
+        }
+        self.signature = signature
+        self.loaded_at = time.time()
+
+    def matching_positions(self, query):
+        """Positions of products whose title/keywords contain every query word (as a word prefix).
+
+        Returns None when the query has no searchable words (e.g. only punctuation).
+        """
+        matched = None
+        for term in TOKEN_RE.findall(query.lower()):
+            hits = set()
+            start = bisect.bisect_left(self.sorted_tokens, term)
+            # Every token with the prefix sorts between `term` and `term` followed by the highest character.
+            end = bisect.bisect_left(self.sorted_tokens, term + '\uffff', start)
+            for token in self.sorted_tokens[start:end]:
+                hits |= self.token_index[token]
+            matched = hits if matched is None else matched & hits
+            if not matched:
+                return frozenset()
+        return matched
+
+
+class ProductCatalog:
+    """The deals.csv catalog, parsed once per worker and indexed by slug and category.
+
+    The file is only re-parsed when its mtime or size changes, and that is checked
+    at most once every `check_interval` seconds, so steady-state lookups do no I/O.
+    """
+
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self, signature):
+        products = []
+        if signature is not None:
+            with metrics.timed('file'), open(self.path, mode='r', encoding='utf-8-sig') as file:
+                reader = csv.DictReader(file)
+                # This removes extra spaces from the CSV column headers
+                reader.fieldnames = [header.strip() for header in reader.fieldnames or []]
+                products = [Product(row) for row in reader]
+            print(f"Product catalog loaded: {len(products)} products from '{self.path}'.")
+        else:
+            print(f"ERROR: {self.path} was not found. The product catalog is empty.")
+        return _Snapshot(products, signature)
+
+    def _current(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._reload_lock:
+                if now >= self._next_check:
+                    signature = self._file_signature()
+                    if self._snapshot is None or signature != self._snapshot.signature:
+                        try:
+                            self._snapshot = self._load(signature)
+                        except Exception as e:
+                            # Keep serving the last good catalog if the file is mid-edit or broken.
+                            print(f"ERROR: Could not reload product catalog: {e}")
+                            if self._snapshot is None:
+                                self._snapshot = _Snapshot([], None)
+                    self._next_check = now + self.check_interval
+        return self._snapshot
+
+    def all(self):
+        return self._current().products
+
+    def get(self, slug):
+        return self._current().by_slug.get(slug)
+
+    def in_category(self, key):
+        return self._current().by_category.get(key, ())
+
+    def search(self, category=None, query=None, sort='default', offset=0, limit=6):
+        """Filters, searches and sorts the catalog using the precomputed indexes.
+
+        Returns (cards, total) where `cards` is the requested slice of lightweight
+        card dicts.
+        """
+        snapshot = self._current()
+        order = snapshot.orders.get(sort)
+        if order is None:
+            raise ValueError(f"Unknown sort order '{sort}'.")
+        allowed = None
+        if category and category != 'all':
+            allowed = snapshot.category_positions.get(category, frozenset())
+        if query and query.strip():
+            matched = snapshot.matching_positions(query)
+            if matched is not None:  # A query with no words filters nothing, like an empty one.
+                allowed = matched if allowed is None else allowed & matched
+        positions = order if allowed is None else [p for p in order if p in allowed]
+        page = positions[offset:offset + limit]
+        return [snapshot.cards[p] for p in page], len(positions)
+
+    def categories(self):
+        return tuple(self._current().by_category.keys())
+
+    def last_modified(self):
+        """The catalog file's modification time (seconds since the epoch), or None if it is missing."""
+        signature = self._current().signature
+        return signature[0] / 1e9 if signature else None
+
+    def __len__(self):
+        return len(self._current().products)
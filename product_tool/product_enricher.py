@@ -3,56 +3,80 @@
 import os
 import csv
 import json
-import time # <-- THIS IS THE FIRST CHANGE
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted
 from dotenv import load_dotenv
 
 # --- Configuration ---
-load_dotenv(dotenv_path='../.env') 
+load_dotenv(dotenv_path='../.env')
 SEED_FILE = 'seed_products.csv'
 OUTPUT_FILE = 'deals_new.csv'
+# Every successful AI result is appended here as soon as it arrives, keyed by a hash
+# of the prompt. Re-runs reuse it, so a crash loses nothing and unchanged products
+# are never sent to Gemini twice.
+CHECKPOINT_FILE = 'enrichment_checkpoint.jsonl'
 
-def enrich_products():
-    """
-    Reads a seed file of products, enriches them with AI-generated content,
-    and writes the result to a new CSV file ready for the website.
-    """
-    print("--- Starting the AI Product Enrichment Script ---")
+MODEL_NAME = 'models/gemini-pro-latest'
+PROMPT_VERSION = 1  # Bump when the prompt changes to re-enrich everything
 
-    # --- 1. Configure the Gemini API ---
-    try:
-        gemini_api_key = os.getenv("GEMINI_API_KEY")
-        if not gemini_api_key:
-            raise Exception("GEMINI_API_KEY not found in .env file.")
-        genai.configure(api_key=gemini_api_key)
-        # We are using a model name confirmed to be available on your account
-        model = genai.GenerativeModel('models/gemini-pro-latest')
-        print("Gemini API configured successfully.")
-    except Exception as e:
-        print(f"!!! FATAL ERROR: Could not configure Gemini API: {e} !!!")
-        return
+# --- Rate Limiting ---
+# Set these to the limits on your Gemini plan. Requests are spread out by a token
+# bucket; a 429 halves the rate, which then creeps back up as calls succeed.
+REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '2'))
+MAX_WORKERS = int(os.getenv('GEMINI_MAX_WORKERS', '4'))
+MAX_ATTEMPTS = 4
 
-    # --- 2. Read the Seed Products ---
-    try:
-        with open(SEED_FILE, mode='r', encoding='utf-8') as infile:
-            reader = csv.DictReader(infile)
-            seed_products = list(reader)
-        print(f"Found {len(seed_products)} products to process in '{SEED_FILE}'.")
-    except FileNotFoundError:
-        print(f"!!! FATAL ERROR: Input file '{SEED_FILE}' not found. Please create it. !!!")
-        return
+HEADERS = ['slug', 'title', 'price', 'image_url', 'affiliate_link', 'category', 'keywords', 'pros', 'cons', 'description']
+
+
+class TokenBucket:
+    """A thread-safe token bucket whose refill rate adapts to 429 responses."""
 
-    enriched_products = []
-    # --- 3. Process Each Product ---
-    for product in seed_products:
-        product_name = product.get('product_name')
-        if not product_name:
-            continue
+    def __init__(self, per_minute, burst=1):
+        self.max_rate = per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
 
-        print(f"\n-> Processing: '{product_name}'...")
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
 
-        # --- 4. Create the AI Prompt ---
-        prompt = f"""
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def slow_down(self):
+        """Called on a 429: halves the rate and empties the bucket."""
+        with self.lock:
+            self._refill()
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+            self.tokens = 0
+            print(f"   ... Rate limited. Slowing down to {self.rate * 60:.2f} requests/minute.")
+
+    def speed_up(self):
+        """Called on a success: recovers 10% of the rate, up to the configured limit."""
+        with self.lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate * 1.1)
+
+
+def build_prompt(product_name):
+    return f"""
         You are an expert affiliate marketer and SEO content writer for an Indian e-commerce audience.
         Your task is to generate a complete data package for the product: "{product_name}".
 
@@ -76,57 +100,181 @@ def enrich_products():
             "keywords": "noise cancelling headphones, sony xm5, wireless headphones, bluetooth headphones, sony india",
             "category": "Tech"
         }}
-        
+
         Now, generate the JSON for: "{product_name}"
         """
 
-        # --- 5. Call the Gemini API and Parse the Response ---
+
+def content_hash(product_name):
+    """Identifies one AI request: the same product name and prompt version always hash the same."""
+    return hashlib.sha256(f"{PROMPT_VERSION}:{MODEL_NAME}:{product_name.strip()}".encode('utf-8')).hexdigest()
+
+
+# --- Checkpoint ---
+def load_checkpoint():
+    """Returns {content hash: AI data} for every product enriched by earlier runs."""
+    results = {}
+    try:
+        with open(CHECKPOINT_FILE, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    results[entry['hash']] = entry['data']
+                except (ValueError, KeyError):
+                    continue  # A line cut short by a crash
+    except FileNotFoundError:
+        pass
+    return results
+
+
+class CheckpointWriter:
+    """Appends results to the checkpoint file, flushed to disk one line at a time."""
+
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def add(self, key, ai_data):
+        with self.lock:
+            self.file.write(json.dumps({'hash': key, 'data': ai_data}) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class OrderedCSVWriter:
+    """Streams rows to the output CSV as they finish, but in seed-file order:
+    a row is written once every row before it has finished (or failed)."""
+
+    def __init__(self, path):
+        self.file = open(path, mode='w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=HEADERS)
+        self.writer.writeheader()
+        self.pending = {}
+        self.next_index = 0
+        self.written = 0
+        self.lock = threading.Lock()
+
+    def add(self, index, row):
+        """Records the result for seed row `index` (None for a failure)."""
+        with self.lock:
+            self.pending[index] = row
+            while self.next_index in self.pending:
+                row = self.pending.pop(self.next_index)
+                if row is not None:
+                    self.writer.writerow(row)
+                    self.written += 1
+                self.next_index += 1
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# --- Enrichment ---
+def generate_product_data(model, bucket, product_name):
+    """Calls Gemini for one product, retrying rate-limit errors."""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        bucket.acquire()
         try:
-            response = model.generate_content(prompt)
+            response = model.generate_content(build_prompt(product_name))
+            bucket.speed_up()
             response_text = response.text.strip().replace('```json', '').replace('```', '')
-            ai_data = json.loads(response_text)
-            
-            final_product_data = {
-                'slug': ai_data.get('slug'),
-                'title': ai_data.get('title'),
-                'price': product.get('price'),
-                'image_url': product.get('image_url'),
-                'affiliate_link': product.get('amazon_url'),
-                'category': ai_data.get('category'),
-                'keywords': ai_data.get('keywords'),
-                'pros': "; ".join(ai_data.get('pros', [])),
-                'cons': "; ".join(ai_data.get('cons', [])),
-                'description': ai_data.get('description')
-            }
-            enriched_products.append(final_product_data)
-            print(f"   ... Success! Content generated.")
-
-        except Exception as e:
-            print(f"   !!! ERROR: Failed to process product. Reason: {e} !!!")
-        
-        # --- THIS IS THE SECOND CHANGE: THE POLITE PAUSE ---
-        # We only pause if there are more products to process
-        if product != seed_products[-1]:
-            print("   ... Pausing for 60 seconds to respect API rate limits ...")
-            time.sleep(60)
-
-    # --- 6. Write the Final Output File ---
-    if not enriched_products:
-        print("\nNo products were successfully enriched. Exiting.")
+            return json.loads(response_text)
+        except ResourceExhausted:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            bucket.slow_down()
+
+
+def build_row(product, ai_data):
+    return {
+        'slug': ai_data.get('slug'),
+        'title': ai_data.get('title'),
+        'price': product.get('price'),
+        'image_url': product.get('image_url'),
+        'affiliate_link': product.get('amazon_url'),
+        'category': ai_data.get('category'),
+        'keywords': ai_data.get('keywords'),
+        'pros': "; ".join(ai_data.get('pros', [])),
+        'cons': "; ".join(ai_data.get('cons', [])),
+        'description': ai_data.get('description')
+    }
+
+
+def enrich_products():
+    """
+    Reads a seed file of products, enriches them with AI-generated content,
+    and writes the result to a new CSV file ready for the website.
+    """
+    print("--- Starting the AI Product Enrichment Script ---")
+
+    # --- 1. Configure the Gemini API ---
+    try:
+        gemini_api_key = os.getenv("GEMINI_API_KEY")
+        if not gemini_api_key:
+            raise Exception("GEMINI_API_KEY not found in .env file.")
+        genai.configure(api_key=gemini_api_key)
+        # We are using a model name confirmed to be available on your account
+        model = genai.GenerativeModel(MODEL_NAME)
+        print("Gemini API configured successfully.")
+    except Exception as e:
+        print(f"!!! FATAL ERROR: Could not configure Gemini API: {e} !!!")
         return
 
-    print(f"\nEnrichment complete. Writing {len(enriched_products)} products to '{OUTPUT_FILE}'...")
-    
-    headers = ['slug', 'title', 'price', 'image_url', 'affiliate_link', 'category', 'keywords', 'pros', 'cons', 'description']
-    
-    with open(OUTPUT_FILE, mode='w', newline='', encoding='utf-8') as outfile:
-        writer = csv.DictWriter(outfile, fieldnames=headers)
-        writer.writeheader()
-        writer.writerows(enriched_products)
+    # --- 2. Read the Seed Products ---
+    try:
+        with open(SEED_FILE, mode='r', encoding='utf-8') as infile:
+            reader = csv.DictReader(infile)
+            seed_products = [p for p in reader if p.get('product_name')]
+        print(f"Found {len(seed_products)} products to process in '{SEED_FILE}'.")
+    except FileNotFoundError:
+        print(f"!!! FATAL ERROR: Input file '{SEED_FILE}' not found. Please create it. !!!")
+        return
+
+    # --- 3. Reuse Earlier Results ---
+    checkpoint = load_checkpoint()
+    keys = [content_hash(p['product_name']) for p in seed_products]
+    todo = [i for i, key in enumerate(keys) if key not in checkpoint]
+    print(f"{len(seed_products) - len(todo)} products already enriched; {len(todo)} to send to Gemini "
+          f"at up to {REQUESTS_PER_MINUTE:g} requests/minute.")
+
+    output = OrderedCSVWriter(OUTPUT_FILE)
+    checkpoint_writer = CheckpointWriter(CHECKPOINT_FILE)
+    try:
+        for i, key in enumerate(keys):
+            if key in checkpoint:
+                output.add(i, build_row(seed_products[i], checkpoint[key]))
+
+        # --- 4. Enrich the Rest Concurrently ---
+        bucket = TokenBucket(REQUESTS_PER_MINUTE)
+        with ThreadPoolExecutor(max_workers=max(1, MAX_WORKERS)) as executor:
+            futures = {executor.submit(generate_product_data, model, bucket, seed_products[i]['product_name']): i for i in todo}
+            for future in as_completed(futures):
+                i = futures[future]
+                product_name = seed_products[i]['product_name']
+                try:
+                    ai_data = future.result()
+                    checkpoint_writer.add(keys[i], ai_data)
+                    output.add(i, build_row(seed_products[i], ai_data))
+                    print(f"-> '{product_name}' ... Success! Content generated.")
+                except Exception as e:
+                    output.add(i, None)
+                    print(f"-> '{product_name}' !!! ERROR: Failed to process product. Reason: {e} !!!")
+    finally:
+        checkpoint_writer.close()
+        output.close()
+
+    # --- 5. Report ---
+    if not output.written:
+        print("\nNo products were successfully enriched.")
+        return
 
-    print(f"--- All done! Your new file is ready: '{OUTPUT_FILE}' ---")
+    print(f"--- All done! {output.written} products written to '{OUTPUT_FILE}' ---")
 
 if __name__ == "__main__":
     enrich_products()
 
-# IT ENDS HERE - COPY EVERYTHING ABOVE THIS LINE
\ No newline at end of file
+# IT ENDS HERE - COPY EVERYTHING ABOVE THIS LINE
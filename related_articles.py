@@ -0,0 +1,204 @@
+import math
+import random
+import re
+from collections import Counter, OrderedDict
+
+# --- Related-content engine ---
+# Each article's neighbours are computed once, when it is inserted, by comparing
+# TF-IDF term vectors (headline, keywords and commentary) against recent articles.
+# The results live in the `related_articles` side table, so an article view only
+# does an indexed lookup instead of sorting the whole table with ORDER BY RANDOM().
+
+NEIGHBOURS_PER_ARTICLE = 6
+CANDIDATE_WINDOW = 1000  # How many recent articles a new one is compared against
+REBUILD_BATCH_SIZE = 500  # Articles linked per transaction by rebuild_related_articles()
+
+# Headline words say the most about what a story is about, commentary the least.
+FIELD_WEIGHTS = (('headline', 3.0), ('seo_keywords', 2.0), ('meta_description', 1.5), ('commentary', 1.0))
+
+STOPWORDS = frozenset("""
+    a about after again all also am an and any are as at be because been before being but by can could
+    did do does doing down during each few for from further had has have having he her here hers him his
+    how if in into is it its itself just more most much new news no nor not now of off on once only or
+    other our out over own said same says she should so some such than that the their them then there
+    these they this those through to too under until up very was we were what when where which while who
+    why will with would you your year years one two first last amid
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9\-]+")
+
+CARD_COLUMNS = 'a.id, a.slug, a.headline, a.image_url, a.image_alt_text, a.timestamp, a.thumbnails, a.revision'
+
+
+def _terms(row):
+    """Returns the weighted term frequencies for one article row."""
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        try:
+            text = row[field]
+        except (IndexError, KeyError):
+            continue
+        for token in TOKEN_RE.findall((text or '').lower()):
+            if token not in STOPWORDS and not token.isdigit():
+                counts[token] += weight
+    return counts
+
+
+def _vectors(term_counts, doc_freq=None):
+    """Builds L2-normalised TF-IDF vectors from {id: term frequencies}, keyed by id."""
+    if doc_freq is None:
+        doc_freq = Counter()
+        for counts in term_counts.values():
+            doc_freq.update(counts.keys())
+    total = len(term_counts)
+    vectors = {}
+    for article_id, counts in term_counts.items():
+        vector = {term: (1 + math.log(tf)) * math.log((1 + total) / (1 + doc_freq[term]))
+                  for term, tf in counts.items() if tf >= 1}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        vectors[article_id] = {term: w / norm for term, w in vector.items()}
+    return vectors
+
+
+def _similarity(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b[term] for term, w in a.items() if term in b)
+
+
+TERM_COLUMNS = 'id, headline, seo_keywords, meta_description, commentary'
+
+
+def _load_candidates(cursor, around_id):
+    cursor.execute(
+        f'SELECT {TERM_COLUMNS} FROM articles WHERE id <= ? ORDER BY id DESC LIMIT ?',
+        (around_id, CANDIDATE_WINDOW + 1)
+    )
+    return {row['id']: _terms(row) for row in cursor.fetchall()}
+
+
+def _store_neighbours(cursor, article_id, scored):
+    """Replaces an article's neighbour list with the top-scoring entries of `scored` (newer ones win ties)."""
+    best = sorted(scored, key=lambda item: (item[1], item[0]), reverse=True)[:NEIGHBOURS_PER_ARTICLE]
+    cursor.execute('DELETE FROM related_articles WHERE article_id = ?', (article_id,))
+    cursor.executemany(
+        'INSERT INTO related_articles (article_id, related_id, score) VALUES (?, ?, ?)',
+        [(article_id, related_id, score) for related_id, score in best]
+    )
+
+
+def _link_article(cursor, article_id, term_counts=None, doc_freq=None):
+    """Stores neighbours for one article and offers it to the lists of the articles it resembles.
+
+    `term_counts` (and optionally its `doc_freq`) are the article's candidate window,
+    if the caller already has them; otherwise they are loaded and tokenised here.
+    """
+    if term_counts is None:
+        term_counts = _load_candidates(cursor, article_id)
+    vectors = _vectors(term_counts, doc_freq)
+    new_vector = vectors.get(article_id)
+    if new_vector is None:
+        return
+    scores = [(other_id, _similarity(new_vector, vector))
+              for other_id, vector in vectors.items() if other_id != article_id]
+    scores = [(other_id, score) for other_id, score in scores if score > 0]
+    _store_neighbours(cursor, article_id, scores)
+
+    # The new article may be a better match for an older one than something already
+    # on its list; only the lists it actually improves are rewritten.
+    for other_id, score in scores:
+        cursor.execute('SELECT related_id, score FROM related_articles WHERE article_id = ?', (other_id,))
+        current = [(row[0], row[1]) for row in cursor.fetchall()]
+        if len(current) < NEIGHBOURS_PER_ARTICLE or score > min(s for _, s in current):
+            _store_neighbours(cursor, other_id, current + [(article_id, score)])
+
+
+def update_related_articles(conn, article_id):
+    """Computes neighbours for a newly inserted article. Call after the row is committed; commits its own changes."""
+    _link_article(conn.cursor(), article_id)
+    conn.commit()
+
+
+def rebuild_related_articles(conn):
+    """Recomputes every article's neighbour list from scratch (used to backfill old databases).
+
+    Articles are replayed in insertion order, which gives the same result as ingesting
+    them one by one. Each is tokenised once: the candidate window slides along with
+    its term counts and document frequencies. Work is committed every
+    REBUILD_BATCH_SIZE articles, so readers and the ingest job are never blocked for long.
+    """
+    cursor = conn.cursor()
+    total = cursor.execute('SELECT COUNT(*) FROM articles').fetchone()[0]
+    print(f"Rebuilding related articles for {total} articles...")
+    cursor.execute('DELETE FROM related_articles')
+    conn.commit()
+    window, doc_freq = OrderedDict(), Counter()
+    last_id, linked = 0, 0
+    while True:
+        rows = conn.execute(f'SELECT {TERM_COLUMNS} FROM articles WHERE id > ? ORDER BY id LIMIT ?',
+                            (last_id, REBUILD_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            counts = _terms(row)
+            window[row['id']] = counts
+            doc_freq.update(counts.keys())
+            if len(window) > CANDIDATE_WINDOW + 1:
+                _, dropped = window.popitem(last=False)
+                doc_freq.subtract(dropped.keys())
+            _link_article(cursor, row['id'], window, doc_freq)
+        conn.commit()
+        last_id = rows[-1]['id']
+        linked += len(rows)
+        print(f"   ... {linked}/{total} articles linked")
+    print("Related articles rebuilt.")
+
+
+def _random_articles(cursor, article_id, exclude_ids, limit, attempts=10):
+    """Samples random older articles by probing random ids on the primary key (no table sort).
+
+    The sample is seeded with the article's id and drawn only from ids below it, so
+    new articles never change it and its page renders the same way every time. The
+    first few articles, with too few older ones, take the ones right after them.
+    """
+    rng = random.Random(article_id)
+    cursor.execute('SELECT MIN(id) FROM articles')
+    low = cursor.fetchone()[0]
+    picked = []
+    seen = set(exclude_ids)
+    if low is not None and low < article_id:
+        for _ in range(limit + attempts):
+            if len(picked) >= limit:
+                break
+            cursor.execute(
+                f'SELECT {CARD_COLUMNS} FROM articles a WHERE a.id >= ? AND a.id < ? ORDER BY a.id LIMIT 1',
+                (rng.randint(low, article_id - 1), article_id)
+            )
+            row = cursor.fetchone()
+            if row is not None and row['id'] not in seen:
+                seen.add(row['id'])
+                picked.append(row)
+    if len(picked) < limit:
+        cursor.execute(f'SELECT {CARD_COLUMNS} FROM articles a WHERE a.id > ? ORDER BY a.id LIMIT ?',
+                       (article_id, limit + len(seen)))
+        picked += [row for row in cursor.fetchall() if row['id'] not in seen][:limit - len(picked)]
+    return picked
+
+
+def get_related_articles(conn, article_id, limit=3):
+    """Returns up to `limit` related article cards, topped up with (seeded) random picks when needed."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f'SELECT {CARD_COLUMNS} FROM related_articles r JOIN articles a ON a.id = r.related_id '
+            'WHERE r.article_id = ? ORDER BY r.score DESC LIMIT ?',
+            (article_id, limit)
+        )
+        related = cursor.fetchall()
+    except Exception as e:
+        print(f"Related articles table unavailable, falling back to random picks: {e}")
+        related = []
+    if len(related) < limit:
+        exclude = {article_id} | {row['id'] for row in related}
+        related = list(related) + _random_articles(cursor, article_id, exclude, limit - len(related))
+    return related
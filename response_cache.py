@@ -0,0 +1,188 @@
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+from flask import make_response, request
+
+from cache import LRUCache
+
+
+class ResponseCache:
+    """Caches fully rendered GET responses, keyed by route + URL + content version.
+
+    `version_func` returns the current content version, which is part of every cache
+    key (so a new version invalidates everything at once). It is polled at most once
+    every `check_interval` seconds. Responses carry a strong ETag and are answered
+    with 304 Not Modified when the client already has them. There is no Last-Modified:
+    an edit or a delete changes a page without changing any article's timestamp.
+
+    If `disk_dir` is set, entries are also written there, so a restarted or freshly
+    forked worker can serve them without re-rendering. The directory holds at most
+    `disk_max_entries` files; the oldest are removed once it grows past that.
+    """
+
+    def __init__(self, version_func, maxsize=512, disk_dir=None, disk_max_entries=5000, check_interval=1.0):
+        self.version_func = version_func
+        self.memory = LRUCache(maxsize=maxsize)
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self._disk_writes = 0
+        self.check_interval = check_interval
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'not_modified': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # --- Version tracking ---
+    def current_version(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    try:
+                        version = self.version_func()
+                    except Exception as e:
+                        print(f"Response cache: could not read content version: {e}")
+                        version = None
+                    if version != self._version:
+                        self._version = version
+                        self.memory.clear()
+                        self._prune_disk(version)
+                    self._next_check = now + self.check_interval
+        return self._version
+
+    def invalidate(self):
+        """Drops every cached response in this worker and forces a version re-check."""
+        with self._lock:
+            self._next_check = 0.0
+            self._version = None
+        self.memory.clear()
+
+    # --- Disk tier ---
+    def _disk_path(self, version, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{version}-{digest}.cache")
+
+    def _disk_get(self, version, key):
+        try:
+            with open(self._disk_path(version, key), 'rb') as f:
+                stored_key, entry = pickle.load(f)
+            return entry if stored_key == key else None
+        except (OSError, pickle.PickleError, EOFError, ValueError):
+            return None
+
+    def _disk_set(self, version, key, entry):
+        path = self._disk_path(version, key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((key, entry), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Response cache: could not write disk entry: {e}")
+            return
+        # Other workers write here too, so recount the directory every tenth of the cap.
+        self._disk_writes += 1
+        if self._disk_writes >= max(1, self.disk_max_entries // 10):
+            self._disk_writes = 0
+            self._trim_disk()
+
+    def _trim_disk(self):
+        try:
+            paths = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith('.cache')]
+            if len(paths) <= self.disk_max_entries:
+                return
+            ages = []
+            for path in paths:
+                try:
+                    ages.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+            ages.sort()
+            for _, path in ages[:len(ages) - self.disk_max_entries]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        except OSError as e:
+            print(f"Response cache: could not trim disk entries: {e}")
+
+    def _prune_disk(self, version):
+        if not self.disk_dir:
+            return
+        prefix = f"{version}-"
+        try:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith('.cache') and not name.startswith(prefix):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, name))
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+
+    # --- The decorator ---
+    def cached(self, view=None, vary=None, args=()):
+        """Decorates a view so its 200 responses are cached and served with an ETag.
+
+        `vary` is an optional callable whose result is added to the cache key, for views
+        that depend on something besides the article content (e.g. deals.csv).
+        `args` names the query-string arguments the view reads; only those are part of
+        the key, so `?utm_source=...` and other junk share the entry for the bare URL.
+        """
+        if view is None:
+            return functools.partial(self.cached, vary=vary, args=args)
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            version = self.current_version()
+            key = (request.endpoint, request.host, request.path,
+                   tuple(request.args.get(name, '').strip() for name in args), vary() if vary else None)
+
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.stats['hits'] += 1
+            elif self.disk_dir and version is not None and (entry := self._disk_get(version, key)) is not None:
+                self.stats['disk_hits'] += 1
+                self.memory.set(key, entry)
+            else:
+                self.stats['misses'] += 1
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body,
+                    'mimetype': response.mimetype,
+                    'headers': [(k, v) for k, v in response.headers.items()
+                                if k.lower() not in ('content-length', 'content-type')],
+                    'etag': hashlib.sha1(body).hexdigest(),
+                }
+                # Don't store if the content changed while we were rendering.
+                if version is not None and self.current_version() == version:
+                    self.memory.set(key, entry)
+                    if self.disk_dir:
+                        self._disk_set(version, key, entry)
+            return self._build_response(entry)
+
+        return wrapper
+
+    def _build_response(self, entry):
+        response = make_response(entry['body'])
+        response.mimetype = entry['mimetype']
+        for header, value in entry['headers']:
+            response.headers[header] = value
+        response.set_etag(entry['etag'])
+        response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            self.stats['not_modified'] += 1
+        return response
+
@@ -0,0 +1,235 @@
+import calendar
+import json
+import os
+import threading
+from datetime import date, datetime, timezone
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from topics import TOPICS
+
+# --- Sitemap Writer ---
+# Sitemaps are streamed straight from the database into static files under
+# SITEMAP_DIR, so crawlers are served pre-built bytes instead of a full table scan.
+#
+# While everything fits in one file, /sitemap.xml is a plain <urlset>. Past
+# URLS_PER_SHARD URLs it becomes a <sitemapindex> pointing at:
+#   sitemaps/pages.xml          - homepage, archive, /deals and every product page
+#   sitemaps/articles-<n>.xml   - articles with ids n*URLS_PER_SHARD+1 .. (n+1)*URLS_PER_SHARD
+# Sharding by id means new articles only ever touch the last shard(s) and the index.
+# Any other change (an edit or a delete among the already-written ids) rewrites
+# every shard.
+
+SITE_URL = 'https://www.lazylion.in'
+SITEMAP_DIR = os.path.join(os.getenv('RENDER_DISK_PATH', '.'), 'sitemaps')
+URLS_PER_SHARD = 50000  # The sitemap protocol's per-file limit
+STATE_FILE = 'state.json'
+
+_write_lock = threading.Lock()
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+def _lastmod(timestamp):
+    """Turns an article timestamp ('2025-10-17 08:00:00') or a datetime/date into YYYY-MM-DD."""
+    if isinstance(timestamp, (datetime, date)):
+        return timestamp.strftime('%Y-%m-%d')
+    return (timestamp or '').split(' ')[0] or date.today().isoformat()
+
+
+def _url_entry(loc, lastmod, changefreq, priority):
+    return (f'    <url>\n        <loc>{escape(loc)}</loc>\n        <lastmod>{lastmod}</lastmod>\n'
+            f'        <changefreq>{changefreq}</changefreq>\n        <priority>{priority}</priority>\n    </url>\n')
+
+
+def iter_urlset(entries):
+    """Streams a <urlset> document from an iterable of (loc, lastmod, changefreq, priority)."""
+    yield XML_HEADER
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for entry in entries:
+        yield _url_entry(*entry)
+    yield '</urlset>\n'
+
+
+def iter_sitemap_index(entries):
+    """Streams a <sitemapindex> document from an iterable of (loc, lastmod)."""
+    yield XML_HEADER
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for loc, lastmod in entries:
+        yield f'    <sitemap>\n        <loc>{escape(loc)}</loc>\n        <lastmod>{lastmod}</lastmod>\n    </sitemap>\n'
+    yield '</sitemapindex>\n'
+
+
+def article_loc(article_id, slug):
+    return f"{SITE_URL}/article/{article_id}/{quote(slug or '')}"
+
+
+def _catalog_lastmod(catalog):
+    modified = catalog.last_modified()
+    if modified is None:
+        return date.today().isoformat()
+    return datetime.fromtimestamp(modified, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def iter_archive_entries(conn, newest):
+    """/archive and the first page of every month and topic listing, from the archive_counts aggregate."""
+    yield (f"{SITE_URL}/archive", newest, 'daily', '0.6')
+    for (month,) in conn.execute(
+            'SELECT month FROM archive_counts GROUP BY month HAVING SUM(article_count) > 0 ORDER BY month DESC'):
+        year, month_num = int(month[:4]), int(month[5:7])
+        # A past month's listing stops changing when the month ends.
+        month_end = f"{month}-{calendar.monthrange(year, month_num)[1]:02d}"
+        yield (f"{SITE_URL}/archive/{year}/{month_num}", min(newest, month_end), 'monthly', '0.5')
+    for (topic,) in conn.execute(
+            'SELECT topic FROM archive_counts GROUP BY topic HAVING SUM(article_count) > 0 ORDER BY topic'):
+        if topic in TOPICS:
+            yield (f"{SITE_URL}/topic/{quote(topic)}", newest, 'daily', '0.6')
+
+
+def archive_entry_count(conn):
+    return conn.execute(
+        'SELECT 1 + (SELECT COUNT(DISTINCT month) FROM archive_counts WHERE article_count > 0)'
+        ' + (SELECT COUNT(DISTINCT topic) FROM archive_counts WHERE article_count > 0)'
+    ).fetchone()[0]
+
+
+def iter_page_entries(conn, catalog):
+    """The homepage, the archive, the storefront and every product page."""
+    row = conn.execute('SELECT MAX(timestamp) FROM articles').fetchone()
+    newest = _lastmod(row[0] if row else None)
+    catalog_lastmod = _catalog_lastmod(catalog)
+    yield (f"{SITE_URL}/", newest, 'daily', '1.0')
+    yield from iter_archive_entries(conn, newest)
+    yield (f"{SITE_URL}/deals", catalog_lastmod, 'weekly', '0.8')
+    for product in catalog.all():
+        yield (f"{SITE_URL}/deals/product/{quote(product.slug)}", catalog_lastmod, 'weekly', '0.8')
+
+
+def iter_article_entries(conn, first_id=None, last_id=None):
+    """Every article (optionally only an id range), read with a streaming cursor."""
+    query = 'SELECT id, slug, timestamp FROM articles'
+    params = ()
+    if first_id is not None:
+        query += ' WHERE id BETWEEN ? AND ?'
+        params = (first_id, last_id)
+    for row in conn.execute(query + ' ORDER BY id', params):
+        yield (article_loc(row[0], row[1]), _lastmod(row[2]), 'monthly', '0.8')
+
+
+def _shard_range(shard):
+    return shard * URLS_PER_SHARD + 1, (shard + 1) * URLS_PER_SHARD
+
+
+def _write_stream(path, chunks):
+    """Writes streamed XML to `path` atomically (readers never see a half-written file)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def current_signature(conn, catalog):
+    """What the generated files depend on: article count, newest id, content version and the deals.csv version."""
+    count = conn.execute('SELECT article_count FROM article_stats WHERE id = 1').fetchone()
+    max_id = conn.execute('SELECT MAX(id) FROM articles').fetchone()[0]
+    version = conn.execute('SELECT version FROM content_version WHERE id = 1').fetchone()
+    return [count[0] if count else 0, max_id or 0, version[0] if version else 0, catalog.last_modified()]
+
+
+def _written_fingerprint(conn, max_id):
+    """Row count and revision total of ids up to `max_id`: changes if any of them was edited or deleted."""
+    return list(conn.execute('SELECT COUNT(*), COALESCE(SUM(revision), 0) FROM articles WHERE id <= ?',
+                             (max_id,)).fetchone())
+
+
+def _read_state():
+    try:
+        with open(os.path.join(SITEMAP_DIR, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(state):
+    path = os.path.join(SITEMAP_DIR, STATE_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _is_sharded(conn, article_count, catalog):
+    return article_count + len(catalog) + 2 + archive_entry_count(conn) > URLS_PER_SHARD
+
+
+def _write_index(conn, shard_count):
+    def entries():
+        yield (f"{SITE_URL}/sitemaps/pages.xml", date.today().isoformat())
+        for shard in range(shard_count):
+            first_id, last_id = _shard_range(shard)
+            row = conn.execute('SELECT MAX(timestamp) FROM articles WHERE id BETWEEN ? AND ?',
+                               (first_id, last_id)).fetchone()
+            if row[0] is not None:
+                yield (f"{SITE_URL}/sitemaps/articles-{shard}.xml", _lastmod(row[0]))
+    _write_stream(os.path.join(SITEMAP_DIR, 'sitemap.xml'), iter_sitemap_index(entries()))
+
+
+def _remove_shards(keep=0):
+    """Removes the shard files; with `keep`, only article shards numbered `keep` and up."""
+    for name in os.listdir(SITEMAP_DIR):
+        if name.startswith('articles-') and name.endswith('.xml'):
+            number = name[len('articles-'):-len('.xml')]
+            if number.isdigit() and int(number) < keep:
+                continue
+        elif keep or name != 'pages.xml':
+            continue
+        os.remove(os.path.join(SITEMAP_DIR, name))
+
+
+def write_sitemaps(conn, catalog, full=False):
+    """(Re)generates the sitemap files.
+
+    In sharded mode only the shards that can contain articles added since the last
+    run are rewritten (plus pages.xml and the index), unless `full` is set or an
+    already-written article was edited or deleted.
+    """
+    with _write_lock:
+        os.makedirs(SITEMAP_DIR, exist_ok=True)
+        signature = current_signature(conn, catalog)
+        article_count, max_id = signature[0], signature[1]
+        state = _read_state()
+
+        if not _is_sharded(conn, article_count, catalog):
+            def everything():
+                yield from iter_page_entries(conn, catalog)
+                yield from iter_article_entries(conn)
+            _write_stream(os.path.join(SITEMAP_DIR, 'sitemap.xml'), iter_urlset(everything()))
+            _remove_shards()
+            shard_count = 0
+        else:
+            shard_count = (max_id - 1) // URLS_PER_SHARD + 1
+            first_shard = 0
+            if not full and state and state.get('shard_count') and state.get('written'):
+                previous_max_id = state['signature'][1]
+                if max_id >= previous_max_id and _written_fingerprint(conn, previous_max_id) == state['written']:
+                    first_shard = previous_max_id // URLS_PER_SHARD
+            if first_shard == 0:
+                _remove_shards(keep=shard_count)  # Shards past the newest id are left over from deletes
+            for shard in range(first_shard, shard_count):
+                first_id, last_id = _shard_range(shard)
+                _write_stream(os.path.join(SITEMAP_DIR, f'articles-{shard}.xml'),
+                              iter_urlset(iter_article_entries(conn, first_id, last_id)))
+            _write_stream(os.path.join(SITEMAP_DIR, 'pages.xml'), iter_urlset(iter_page_entries(conn, catalog)))
+            _write_index(conn, shard_count)
+
+        _write_state({'signature': signature, 'shard_count': shard_count,
+                      'written': _written_fingerprint(conn, max_id) if shard_count else None})
+
+
+def ensure_sitemaps(conn, catalog):
+    """Regenerates the sitemap files if articles or deals.csv changed since they were written."""
+    state = _read_state()
+    if state is None or state.get('signature') != current_signature(conn, catalog) \
+            or not os.path.exists(os.path.join(SITEMAP_DIR, 'sitemap.xml')):
+        write_sitemaps(conn, catalog)
@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# --- Startup Report ---
+# app.py imports this module first and calls app_loaded() at the end, so each worker
+# logs how long loading the app took and, once it has answered one, how long after
+# boot its first request finished. Both are exported on /metrics. For a per-module
+# breakdown, `python manage.py startup-report` imports the app in a fresh
+# interpreter under `-X importtime` and lists what it spent the time on.
+#
+# The web-serving path should only need Flask, sqlite3 and the templates: the cron
+# jobs' NewsAPI/LLM/GCS machinery (content_creator, backup_script) and Pillow are
+# imported on first use, and the report shows if one of them creeps back in.
+
+STARTED = time.perf_counter()
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Modules that should never be imported just to serve pages.
+HEAVY_MODULES = ('content_creator', 'backup_script', 'newsapi', 'google.cloud.storage', 'PIL.Image', 'requests')
+
+STATE = {'app_loaded_seconds': None, 'first_request_seconds': None}
+_first_request_lock = threading.Lock()
+APP_LOADED = FIRST_REQUEST = None  # metrics.Gauge objects, created by init_app()
+
+
+def app_loaded():
+    """Records (and logs) how long it took to import and set up app.py."""
+    STATE['app_loaded_seconds'] = elapsed = time.perf_counter() - STARTED
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"Startup: app loaded in {elapsed * 1000:.0f} ms"
+          + (f" (heavy modules already imported: {', '.join(loaded)})." if loaded else "."))
+    if APP_LOADED is not None:
+        APP_LOADED.set(round(elapsed, 6))
+
+
+def init_app(app):
+    """Records when the first request finishes and exports the startup timings on /metrics."""
+    global APP_LOADED, FIRST_REQUEST
+    import metrics
+    APP_LOADED = metrics.Gauge('startup_app_loaded_seconds', 'Time from the start of app.py imports until the app was set up.')
+    FIRST_REQUEST = metrics.Gauge('startup_first_request_seconds', 'Time from the start of app.py imports until the first response was ready.')
+    metrics.EXPORTED.extend((APP_LOADED, FIRST_REQUEST))
+
+    @app.after_request
+    def record_first_request(response):
+        if STATE['first_request_seconds'] is None:
+            with _first_request_lock:
+                if STATE['first_request_seconds'] is None:
+                    STATE['first_request_seconds'] = elapsed = time.perf_counter() - STARTED
+                    FIRST_REQUEST.set(round(elapsed, 6))
+                    print(f"Startup: first request answered {elapsed * 1000:.0f} ms after boot.")
+        return response
+
+
+# --- manage.py startup-report ---
+_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+loaded = time.perf_counter()
+response = app.app.test_client().get(sys.argv[1])
+answered = time.perf_counter()
+print(json.dumps({"import_seconds": loaded - started, "first_request_seconds": answered - loaded,
+                  "status": response.status_code, "modules": sorted(sys.modules)}))
+'''
+
+
+def _parse_importtime(stderr):
+    """Parses `-X importtime` output into [(module, self µs, cumulative µs, depth)]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def startup_report(path='/', top=15):
+    """Imports the app in a fresh interpreter and times its imports and first request."""
+    import subprocess
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _PROBE, path],
+                            cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    # `-X importtime` lists a module's imports right before the module itself, so
+    # app.py's direct imports are the depth-1 rows since the previous top-level one.
+    direct, pending = [], []
+    for name, _, cumulative, depth in _parse_importtime(result.stderr):
+        if depth == 1:
+            pending.append((name, cumulative))
+        elif depth == 0:
+            if name == 'app':
+                direct = pending
+            pending = []
+    direct.sort(key=lambda item: item[1], reverse=True)
+    return {
+        'import_seconds': round(timings['import_seconds'], 4),
+        'first_request_seconds': round(timings['first_request_seconds'], 4),
+        'first_request_status': timings['status'],
+        'slowest_imports': [{'module': name, 'ms': round(us / 1000, 1)} for name, us in direct[:top]],
+        'heavy_modules_loaded': [name for name in HEAVY_MODULES if name in timings['modules']],
+    }
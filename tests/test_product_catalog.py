@@ -0,0 +1,36 @@
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_catalog import PRODUCT_FIELDS, ProductCatalog
+
+
+def _catalog(tmp_path, rows):
+    path = tmp_path / 'deals.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=PRODUCT_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row.get(field, '') for field in PRODUCT_FIELDS})
+    return ProductCatalog(str(path))
+
+
+def test_punctuation_only_query_with_category_filters_by_category_only(tmp_path):
+    catalog = _catalog(tmp_path, [
+        {'slug': 'echo', 'title': 'Echo Speaker', 'price': '9,999', 'category': 'Tech'},
+        {'slug': 'kettle', 'title': 'Electric Kettle', 'price': '1,499', 'category': 'Home'},
+    ])
+    cards, total = catalog.search(category='tech', query='!!')
+    assert total == 1
+    assert [card['slug'] for card in cards] == ['echo']
+
+
+def test_query_words_match_as_prefixes(tmp_path):
+    catalog = _catalog(tmp_path, [
+        {'slug': 'echo', 'title': 'Echo Speaker', 'category': 'Tech'},
+        {'slug': 'kettle', 'title': 'Electric Kettle', 'category': 'Home'},
+    ])
+    assert [card['slug'] for card in catalog.search(query='spea')[0]] == ['echo']
+    assert catalog.search(query='spea kett')[1] == 0
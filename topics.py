@@ -0,0 +1,48 @@
+import re
+
+# --- Topics ---
+# Every article gets one topic when it is saved (content_creator.py), again when
+# backfill-keywords fills in its SEO keywords, and older rows get theirs when the
+# schema is migrated (database.py). The topic is whichever one's keywords appear
+# most often in the headline (counted double) and the SEO keywords; ties go to the
+# topic listed first, and an article matching none is 'general'.
+# Changing the keywords only affects articles saved afterwards, unless you run
+# `python manage.py reassign-topics`.
+
+# slug -> (name shown on pages, keywords)
+TOPICS = {
+    'ai': ('AI', (
+        'ai', 'artificial intelligence', 'openai', 'chatgpt', 'gpt', 'gemini', 'llm', 'llms', 'machine learning',
+        'generative', 'chatbot', 'chatbots', 'deepmind', 'anthropic', 'copilot', 'nvidia', 'neural')),
+    'gadgets': ('Gadgets & Smartphones', (
+        'smartphone', 'smartphones', 'phone', 'phones', 'iphone', 'android', 'samsung', 'galaxy', 'pixel',
+        'oneplus', 'xiaomi', 'gadget', 'gadgets', 'laptop', 'laptops', 'tablet', 'ipad', 'wearable',
+        'smartwatch', 'earbuds', 'camera', 'launch', 'price in india')),
+    'startups': ('Startups & Business', (
+        'startup', 'startups', 'funding', 'raises', 'ipo', 'unicorn', 'valuation', 'investor', 'investors',
+        'venture', 'acquisition', 'acquires', 'layoffs', 'revenue', 'profit', 'shares', 'stock', 'earnings')),
+    'geopolitics': ('Geopolitics', (
+        'geopolitics', 'war', 'china', 'russia', 'ukraine', 'pakistan', 'tariff', 'tariffs', 'sanctions',
+        'election', 'minister', 'diplomatic', 'border', 'trade deal', 'nato', 'government', 'policy')),
+    'general': ('In the News', ()),
+}
+DEFAULT_TOPIC = 'general'
+
+_PATTERNS = {
+    slug: re.compile(r'\b(?:' + '|'.join(re.escape(keyword) for keyword in keywords) + r')\b', re.IGNORECASE)
+    for slug, (_, keywords) in TOPICS.items() if keywords
+}
+
+
+def assign_topic(headline, seo_keywords=None):
+    """Returns the topic slug for an article."""
+    best, best_score = DEFAULT_TOPIC, 0
+    for slug, pattern in _PATTERNS.items():
+        score = 2 * len(pattern.findall(headline or '')) + len(pattern.findall(seo_keywords or ''))
+        if score > best_score:
+            best, best_score = slug, score
+    return best
+
+
+def topic_name(slug):
+    return TOPICS[slug][0] if slug in TOPICS else TOPICS[DEFAULT_TOPIC][0]